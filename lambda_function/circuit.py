@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised by a publisher instead of sending while the endpoint circuit is open (message not sent)."""
+
+
+class CircuitBreaker:
+    """
+    Shared across every lane publisher so one endpoint outage is seen once, not per lane.
+
+    - closed: everything goes through; each attempt's outcome is recorded. Trips to open after
+      `consecutive_failures` failures in a row, or when the failure rate over the last `window`
+      outcomes reaches `error_rate` (once at least `min_requests` outcomes are in the window).
+    - open: allow() is False, publishers fail fast with CircuitOpenError. After `open_secs`
+      the next allow() becomes a single half-open probe.
+    - half_open: only the probe is in flight; success closes the circuit, failure reopens it.
+    """
+
+    def __init__(self, consecutive_failures: int = 20, error_rate: float = 0.5, window: int = 100,
+                 min_requests: int = 50, open_secs: float = 5.0):
+        self.consecutive_failures = max(1, int(consecutive_failures))
+        self.error_rate = float(error_rate)
+        self.min_requests = max(1, int(min_requests))
+        self.open_secs = max(0.0, float(open_secs))
+        self.state = CLOSED
+        self.trips = 0
+        self._outcomes: "deque[bool]" = deque(maxlen=max(1, int(window)))
+        self._failures_in_window = 0
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != CLOSED
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:  # fast path, no lock
+            return True
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_secs:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._reset(CLOSED)
+                return
+            if self.state == OPEN:
+                return  # late result of a request sent before the trip
+            self._consecutive = 0
+            self._push(False)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._trip()
+                return
+            if self.state == OPEN:
+                return
+            self._consecutive += 1
+            self._push(True)
+            n = len(self._outcomes)
+            if self._consecutive >= self.consecutive_failures or (
+                n >= self.min_requests and self._failures_in_window / n >= self.error_rate
+            ):
+                self._trip()
+
+    def _push(self, failed: bool) -> None:
+        if len(self._outcomes) == self._outcomes.maxlen and self._outcomes[0]:
+            self._failures_in_window -= 1
+        self._outcomes.append(failed)
+        if failed:
+            self._failures_in_window += 1
+
+    def _trip(self) -> None:
+        self._reset(OPEN)
+        self.trips += 1
+        self._opened_at = time.monotonic()
+
+    def _reset(self, state: str) -> None:
+        self.state = state
+        self._outcomes.clear()
+        self._failures_in_window = 0
+        self._consecutive = 0
+        self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "trips": self.trips}
+
+
+def breaker_from_config(cfg: Any) -> Optional[CircuitBreaker]:
+    """circuit: false disables; a dict overrides the defaults; missing/true uses them."""
+    if cfg is False:
+        return None
+    cfg = cfg if isinstance(cfg, dict) else {}
+    if cfg.get("enabled") is False:
+        return None
+    return CircuitBreaker(
+        consecutive_failures=cfg.get("consecutive_failures", 20),
+        error_rate=cfg.get("error_rate", 0.5),
+        window=cfg.get("window", 100),
+        min_requests=cfg.get("min_requests", 50),
+        open_secs=cfg.get("open_secs", 5.0),
+    )
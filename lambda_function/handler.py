@@ -1,22 +1,17 @@
 import base64
 import json
-import os
 import time
-from typing import Any, Dict, Iterable, Tuple
+from typing import Any, Dict
 
+from .circuit import breaker_from_config
 from .lanes import LaneMux
+from .profiler import SamplingProfiler
 from .publisher_http import SubmitterHttpPublisher
+from .publisher_sink import FileLanePublisher, FileSink, NullLanePublisher
 from .publisher_sns import SnsLanePublisher
-from .s3_reader import iter_ndjson, iter_json_array_small, parse_s3_uri
-from .template import load_template_from_package_or_s3, render_with_loan
-from .util import (
-    derive_event_name,
-    extract_loan,
-    generate_loan_number,
-    normalize_loan_10,
-    stable_hash,
-    time_budget_seconds,
-)
+from .jobs import jobs_from_event, weighted_interleave
+from .s3_reader import parse_s3_uri
+from .util import time_budget_seconds
 
 def _get(d: Dict[str, Any], path: str, default=None):
     cur = d
@@ -28,18 +23,98 @@ def _get(d: Dict[str, Any], path: str, default=None):
             return default
     return cur
 
+def _sink_stats(publishers, file_sink, event: Dict[str, Any], elapsed: float) -> Dict[str, Any]:
+    """Producer-side throughput for the null/file backends; uploads the capture file if asked."""
+    messages = sum(p.messages for p in publishers)
+    body_bytes = sum(p.bytes for p in publishers)
+    elapsed = max(elapsed, 1e-6)
+    stats = {
+        "messages": messages,
+        "bytes": body_bytes,
+        "msgs_per_s": round(messages / elapsed, 1),
+        "bytes_per_s": round(body_bytes / elapsed, 1),
+    }
+    if file_sink is not None:
+        file_sink.close()
+        stats.update({"path": file_sink.path, "format": file_sink.fmt, "file_bytes": file_sink.bytes_written})
+        if file_sink.bytes_dropped:
+            stats["dropped_bytes"] = file_sink.bytes_dropped
+        upload_uri = _get(event, "file.s3_uri")
+        if upload_uri:
+            import boto3  # lazy import, like template loading
+            bucket, key = parse_s3_uri(upload_uri)
+            boto3.client("s3").upload_file(file_sink.path, bucket, key)
+            stats["s3_uri"] = upload_uri
+    return stats
+
+def _job_result(job, counts, elapsed: float, rejected=None) -> Dict[str, Any]:
+    processed, failed, rejected_count = counts
+    out = {
+        "weight": job.weight,
+        "submitted": job.submitted,
+        "processed": processed,
+        "failed": failed,
+        "rejected": rejected_count,
+        "msgs_per_s": round(processed / max(elapsed, 1e-6), 1),
+    }
+    out.update(job.cursor(rejected))
+    return out
+
+def _start_profiler(event: Dict[str, Any]):
+    """debug.profile: true, or { interval_ms, max_overhead_pct, stack_depth, tracemalloc, top_n, s3_uri }."""
+    cfg = _get(event, "debug.profile")
+    if not cfg:
+        return None, {}
+    cfg = cfg if isinstance(cfg, dict) else {}
+    profiler = SamplingProfiler(
+        interval_s=float(cfg.get("interval_ms") or 10) / 1000.0,
+        max_overhead=float(cfg.get("max_overhead_pct") or 2) / 100.0,
+        stack_depth=int(cfg.get("stack_depth") or 24),
+        trace_malloc=bool(cfg.get("tracemalloc")),
+    )
+    return profiler.start(), cfg
+
+def _profile_result(profiler: SamplingProfiler, cfg: Dict[str, Any], job_id: str) -> Dict[str, Any]:
+    """Compact summary inline, or the full summary written to S3 with only a pointer returned."""
+    profiler.stop()
+    summary = profiler.summary(top_n=int(cfg.get("top_n") or 15))
+    s3_uri = cfg.get("s3_uri")
+    if not s3_uri:
+        return summary
+    import boto3  # lazy import, like template loading
+    bucket, key = parse_s3_uri(s3_uri)
+    if key.endswith("/") or not key:
+        key = f"{key}{job_id}-profile.json"
+    boto3.client("s3").put_object(Bucket=bucket, Key=key, Body=json.dumps(summary).encode("utf-8"),
+                                  ContentType="application/json")
+    return {
+        "s3_uri": f"s3://{bucket}/{key}",
+        "samples": summary["samples"],
+        "overhead_pct": summary["overhead_pct"],
+        "top_functions": summary["top_functions"][:3],
+    }
+
 def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     """
     Event keys (subset):
       - mode: "S3_REPLAY" | "TEMPLATE_CLONE"
-      - backend: "submitter_http" | "sns" (default submitter_http)
+      - backend: "submitter_http" | "sns" | "null" | "file" (default submitter_http)
       - http: { base_url, path, max_pool, timeout_s }
       - sns:  { topic_arn }
-      - publish: { lane_count, max_workers, time_budget_secs, max_messages_per_invocation }
+      - file: { path, format ("ndjson" | "length_prefixed"), buffer_bytes, s3_uri }
+      - publish: { lane_count, max_workers, time_budget_secs, max_messages_per_invocation, submit_chunk }
       - grouping: { loan_field, strict_fifo_per_loan }
-      - s3_replay: { s3_uri, format, offset, limit, event_name }
+      - s3_replay: { s3_uri | s3_prefix, format, offset, limit, event_name,
+                     read_ahead: true | { concurrency, part_mb },                     # s3_uri only; off by default
+                     order ("key" | "merge"), merge_field, prefetch, cursor,          # s3_prefix only
+                     template_name | template_s3_uri | template_inline, columns,
+                     loan_column, delimiter }                                       # format "csv" only
       - template_clone: { template_name | template_s3_uri | template_inline, count, seq_start, loan_number_rule, sequence_prefix, event_name }
       - attributes: dict (merged into attributes for each publish)
+      - jobs: [ { name, weight, mode, s3_replay | template_clone, event_name, attributes }, ... ]
+              replaces mode/s3_replay/template_clone; jobs share lanes and are interleaved by weight
+      - circuit: false | { consecutive_failures, error_rate, window, min_requests, open_secs }
+      - debug: { profile: true | { interval_ms, max_overhead_pct, stack_depth, tracemalloc, top_n, s3_uri } }
     """
     orig_event = event
     is_alb_event = isinstance(event, dict) and bool(event.get("requestContext", {}).get("elb"))
@@ -53,8 +128,8 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
 
     start = time.time()
     job_id = event.get("job_id") or f"JOB-{int(start)}"
-    mode = event.get("mode")
-    if mode not in ("S3_REPLAY", "TEMPLATE_CLONE"):
+    multi_job = bool(event.get("jobs"))
+    if not multi_job and event.get("mode") not in ("S3_REPLAY", "TEMPLATE_CLONE"):
         raise ValueError("mode must be S3_REPLAY or TEMPLATE_CLONE")
 
     backend = event.get("backend", "submitter_http")
@@ -64,6 +139,8 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     max_workers = int(_get(event, "publish.max_workers", lane_count))
     time_budget = time_budget_seconds(event, context, default=_get(event, "publish.time_budget_secs", 840))
     max_messages = _get(event, "publish.max_messages_per_invocation", 0) or 0
+    # records are handed to the lanes in chunks: one queue put per lane per chunk
+    submit_chunk = max(1, int(_get(event, "publish.submit_chunk", 256)))
 
     grouping = event.get("grouping", {}) or {}
     loan_field = grouping.get("loan_field", "loanNumber")
@@ -72,7 +149,16 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     base_attrs = event.get("attributes", {}) or {}
     base_attrs.setdefault("jobId", job_id)
 
-    # Build lane workers
+    # Record sources: the event itself, or one per entry of `jobs`
+    jobs = jobs_from_event(event, job_id, loan_field, lane_count, base_attrs)
+
+    # Build lane workers (null/file sinks keep their publishers to report throughput)
+    sink_publishers = []
+    file_sink = None
+    breaker = None
+    if backend in ("submitter_http", "sns"):
+        # one breaker shared by every lane: an endpoint outage stops the whole invocation early
+        breaker = breaker_from_config(event.get("circuit"))
     if backend == "submitter_http":
         http_cfg = event.get("http", {}) or {}
         base_url = http_cfg.get("base_url")
@@ -83,7 +169,7 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
         timeout_s = float(http_cfg.get("timeout_s", 3))
         def worker_factory(lane_id: int) -> SubmitterHttpPublisher:
             return SubmitterHttpPublisher(
-                base_url=base_url, path=path, max_pool=max_pool, timeout_s=timeout_s
+                base_url=base_url, path=path, max_pool=max_pool, timeout_s=timeout_s, breaker=breaker
             )
     elif backend == "sns":
         sns_cfg = event.get("sns", {}) or {}
@@ -91,112 +177,95 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
         if not topic_arn:
             raise ValueError("sns.topic_arn is required for sns backend")
         def worker_factory(lane_id: int) -> SnsLanePublisher:
-            return SnsLanePublisher(topic_arn=topic_arn, batch_size=10)
+            return SnsLanePublisher(topic_arn=topic_arn, batch_size=10, breaker=breaker)
+    elif backend == "null":
+        def worker_factory(lane_id: int) -> NullLanePublisher:
+            pub = NullLanePublisher()
+            sink_publishers.append(pub)
+            return pub
+    elif backend == "file":
+        file_cfg = event.get("file", {}) or {}
+        file_fmt = (file_cfg.get("format") or "ndjson").lower()
+        file_path = file_cfg.get("path") or f"/tmp/{job_id}.{'ndjson' if file_fmt == 'ndjson' else 'bin'}"
+        file_sink = FileSink(file_path, fmt=file_fmt, buffer_bytes=int(file_cfg.get("buffer_bytes") or (1 << 20)))
+        def worker_factory(lane_id: int) -> FileLanePublisher:
+            pub = FileLanePublisher(file_sink, lane_count=lane_count)
+            sink_publishers.append(pub)
+            return pub
     else:
-        raise ValueError("backend must be submitter_http or sns")
-
-    lanes = LaneMux(lane_count=lane_count, max_workers=max_workers, worker_factory=worker_factory)
+        raise ValueError("backend must be submitter_http, sns, null or file")
 
     processed = 0
     failed = 0
-    next_offset = None
+    pending = []
+    stopped_reason = None
+    lanes = None
+    profiler = None
 
     try:
-        if mode == "S3_REPLAY":
-            s3r = event.get("s3_replay", {}) or {}
-            s3_uri = s3r.get("s3_uri")
-            if not s3_uri:
-                raise ValueError("s3_replay.s3_uri is required in S3_REPLAY mode")
-            fmt = (s3r.get("format") or "ndjson").lower()
-            offset = int(s3r.get("offset") or 0)
-            _limit = int(s3r.get("limit") or 0)
-            src_name = os.path.basename(parse_s3_uri(s3_uri)[1])
-            default_event_name = derive_event_name(src_name, s3r.get("event_name"), None)
-
-            if fmt == "ndjson":
-                records: Iterable[Tuple[int, Dict[str, Any]]] = iter_ndjson(s3_uri, start_offset=offset)
-            elif fmt == "json_array":
-                # Warning: loads into memory; for small files only
-                arr = iter_json_array_small(s3_uri)
-                records = ((i + offset, r) for i, r in enumerate(arr[offset:]))
-            else:
-                raise ValueError("s3_replay.format must be ndjson or json_array")
-
-            for seq, rec in records:
-                # strict per-loan FIFO: submit to the loan's lane (ordered)
-                loan = extract_loan(rec, loan_field=loan_field)
-                event_name = derive_event_name(src_name, s3r.get("event_name"), rec)
-                attrs = dict(base_attrs)
-                attrs.update({"eventName": event_name, "loanNumber": loan})
-                payload = rec.get("payload", rec)
-                lane_id = stable_hash(loan) % lane_count
-                lanes.submit(lane_id, {"loan": loan, "event_name": event_name, "payload": payload, "attributes": attrs, "seq": seq})
-
-                processed += 1
-                next_offset = seq + 1
-
-                if max_messages and processed >= max_messages:
+        # built inside the try: if a publisher cannot be created the file sink still gets closed
+        lanes = LaneMux(lane_count=lane_count, max_workers=max_workers, worker_factory=worker_factory)
+        # started inside the try so the sampler (and tracemalloc) never outlive the invocation
+        profiler, profile_cfg = _start_profiler(event)
+        # jobs share the lanes; the scheduler interleaves them by weight
+        for job, lane_id, item in weighted_interleave(jobs):
+            pending.append((lane_id, item))
+            processed += 1
+
+            if max_messages and processed >= max_messages:
+                break
+            if len(pending) >= submit_chunk:
+                lanes.submit_many(pending)
+                pending = []
+                # time budget and circuit are checked once per chunk
+                if breaker is not None and breaker.is_open:
+                    stopped_reason = "circuit_open"
                     break
-                remaining = time_budget - (time.time() - start)
-                if remaining <= 5:
+                if time_budget - (time.time() - start) <= 5:
                     break
 
-        else:  # TEMPLATE_CLONE
-            tcfg = event.get("template_clone", {}) or {}
-            # Source template: package (lambda_function/samples/), S3, or inline
-            template_name = tcfg.get("template_name") or "Loan_Event_Sample.json"
-            template_s3_uri = tcfg.get("template_s3_uri")
-            template_inline = tcfg.get("template_inline")
-            template, src_name = load_template_from_package_or_s3(template_name, template_s3_uri, template_inline)
-
-            default_event_name = derive_event_name(src_name, tcfg.get("event_name"), template)
-
-            count = int(tcfg.get("count") or 0)
-            if count <= 0:
-                raise ValueError("template_clone.count must be > 0")
-            seq_start = int(tcfg.get("seq_start") or 0)
-            seq_prefix = tcfg.get("sequence_prefix")  # digits string or None
-            loan_rule = (tcfg.get("loan_number_rule") or "derive_per_seq").lower()
-
-            # publish N clones
-            for i in range(seq_start, seq_start + count):
-                # compute loan number
-                if loan_rule == "derive_per_seq":
-                    loan = generate_loan_number(prefix=seq_prefix or "", seq=i, job_id=job_id)
-                else:
-                    # keep from template; then ensure 10 digits
-                    raw_loan = template.get("loanNumber") or template.get("LoanNumber") or ""
-                    if not raw_loan:
-                        raise ValueError("Template missing loanNumber; set loan_number_rule=derive_per_seq or provide loanNumber in template_inline")
-                    loan = normalize_loan_10(raw_loan)
-
-                # render payload (deep replace placeholders)
-                payload = render_with_loan(template, loan, i)
-
-                attrs = dict(base_attrs)
-                attrs.update({"eventName": default_event_name, "loanNumber": loan})
-                lane_id = stable_hash(loan) % lane_count
-                lanes.submit(lane_id, {"loan": loan, "event_name": default_event_name, "payload": payload, "attributes": attrs, "seq": i})
-
-                processed += 1
-                next_offset = i + 1
-
-                remaining = time_budget - (time.time() - start)
-                if remaining <= 5:
-                    break
+        # records left over from the last partial chunk
+        lanes.submit_many(pending)
+        pending = []
 
         # drain lanes until deadline
         p2, f2 = lanes.drain_and_close(deadline_epoch=start + time_budget)
         processed = p2  # count final successful sends
         failed += f2
 
+        if breaker is not None and breaker.is_open:
+            stopped_reason = "circuit_open"
+
+        elapsed = time.time() - start
         result = {
             "processed": processed,
             "failed": failed,
-            "next_offset": next_offset,
-            "partial": (time.time() - start) >= (time_budget - 1) or (max_messages and processed >= max_messages),
-            "elapsed_ms": int((time.time() - start) * 1000),
+            "partial": elapsed >= (time_budget - 1) or (max_messages and processed >= max_messages)
+                       or stopped_reason is not None,
+            "elapsed_ms": int(elapsed * 1000),
         }
+        rejected_min = {}
+        if breaker is not None and breaker.trips:
+            # messages the open circuit refused were never sent; cursors move back to cover them
+            result["rejected"], rejected_min = lanes.rejected()
+            result["circuit"] = breaker.stats()
+        if stopped_reason is not None:
+            result["stopped_reason"] = stopped_reason
+            result["circuit_open"] = stopped_reason == "circuit_open"
+        if multi_job:
+            job_counts = lanes.job_counts()
+            result["jobs"] = {
+                job.name: _job_result(job, job_counts.get(job.name, (0, 0, 0)), elapsed, rejected_min.get(job.name))
+                for job in jobs
+            }
+        else:
+            result.update(jobs[0].cursor(rejected_min.get(jobs[0].name)))
+        if sink_publishers:
+            # stop every lane (flushing its buffer) before the sink is closed and measured
+            lanes.force_close()
+            result["sink"] = _sink_stats(sink_publishers, file_sink, event, elapsed=time.time() - start)
+        if profiler is not None:
+            result["profile"] = _profile_result(profiler, profile_cfg, job_id)
 
         if is_alb_event:
             return {
@@ -209,4 +278,11 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
         return result
 
     finally:
-        lanes.force_close()
+        if lanes is not None:
+            lanes.force_close()  # before the sink is closed, so lane buffers still reach it
+        if profiler is not None:
+            profiler.stop()
+        if file_sink is not None:
+            file_sink.close()
+        for job in jobs:
+            job.close()
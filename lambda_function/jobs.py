@@ -0,0 +1,253 @@
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .s3_reader import (
+    DEFAULT_PART_SIZE,
+    S3PrefixReader,
+    iter_csv_rows,
+    iter_ndjson,
+    iter_json_array_small,
+    parse_s3_uri,
+)
+from .template import compile_row_renderer, load_template_from_package_or_s3, render_with_loan
+from .util import (
+    derive_event_name,
+    extract_loan,
+    generate_loan_number,
+    normalize_loan_10,
+    stable_hash,
+)
+
+MODES = ("S3_REPLAY", "TEMPLATE_CLONE")
+
+def _read_ahead(cfg: Any) -> Tuple[int, int]:
+    """
+    s3_replay.read_ahead -> (concurrency, part_size). Opt-in, since it adds a HeadObject and turns
+    one streaming GET into parallel ranged GETs: true or a non-empty { concurrency, part_mb }
+    enables it (concurrency 8, 8 MB parts by default); missing, false or {} keeps a single GET.
+    """
+    ra = cfg if isinstance(cfg, dict) else {}
+    if cfg is not True and not ra:
+        return 1, DEFAULT_PART_SIZE
+    concurrency = max(1, int(ra.get("concurrency") or 8))
+    part_size = max(1, int(float(ra.get("part_mb") or DEFAULT_PART_SIZE / (1 << 20)) * (1 << 20)))
+    return concurrency, part_size
+
+class Job:
+    """
+    One record source (S3_REPLAY or TEMPLATE_CLONE) turned into (lane_id, item) pairs for LaneMux.
+    Config is validated and sources are opened eagerly so bad events fail before publishing starts.
+    Items carry "job": name so lane workers can keep per-job counters.
+    """
+
+    def __init__(self, name: str, cfg: Dict[str, Any], job_id: str, loan_field: str,
+                 lane_count: int, base_attrs: Dict[str, Any], weight: float = 1):
+        self.name = name
+        self.mode = cfg.get("mode")
+        if self.mode not in MODES:
+            raise ValueError("mode must be S3_REPLAY or TEMPLATE_CLONE")
+        self.weight = float(weight)
+        if self.weight <= 0:
+            raise ValueError(f"job {name!r}: weight must be > 0")
+        self.job_id = job_id
+        self.loan_field = loan_field
+        self.lane_count = lane_count
+        self.attrs = dict(base_attrs)
+        self.attrs.update(cfg.get("attributes") or {})
+        self.submitted = 0
+        self.next_offset: Optional[int] = None
+        self.prefix_reader: Optional[S3PrefixReader] = None
+
+        if self.mode == "S3_REPLAY":
+            s3r = cfg.get("s3_replay", {}) or {}
+            self._records = self._open_s3_replay(s3r, cfg.get("event_name") or s3r.get("event_name"))
+        else:  # TEMPLATE_CLONE
+            tcfg = cfg.get("template_clone", {}) or {}
+            self._records = self._open_template_clone(tcfg, cfg.get("event_name") or tcfg.get("event_name"))
+
+    def _open_s3_replay(self, s3r: Dict[str, Any], explicit_event: Optional[str]) -> Iterator[Tuple[int, str, str, Dict, Optional[str]]]:
+        loan_field = self.loan_field
+        s3_uri = s3r.get("s3_uri")
+        s3_prefix = s3r.get("s3_prefix")
+        if not s3_uri and not s3_prefix:
+            raise ValueError("s3_replay.s3_uri or s3_replay.s3_prefix is required in S3_REPLAY mode")
+        fmt = (s3r.get("format") or "ndjson").lower()
+        offset = int(s3r.get("offset") or 0)
+        _limit = int(s3r.get("limit") or 0)
+
+        if s3_prefix:
+            if fmt != "ndjson":
+                raise ValueError("s3_replay.s3_prefix only supports format ndjson")
+            self.prefix_reader = S3PrefixReader(
+                s3_prefix,
+                order=(s3r.get("order") or "key").lower(),
+                merge_field=s3r.get("merge_field"),
+                prefetch=int(s3r.get("prefetch") or 4),
+                cursor=s3r.get("cursor"),
+                max_merge_objects=int(s3r.get("max_merge_objects") or 256),
+            )
+            records = self.prefix_reader.records()
+        else:
+            src_name = os.path.basename(parse_s3_uri(s3_uri)[1])
+            concurrency, part_size = _read_ahead(s3r.get("read_ahead"))
+            if fmt == "ndjson":
+                rows = iter_ndjson(s3_uri, start_offset=offset, concurrency=concurrency, part_size=part_size)
+                records = ((src_name, seq, rec) for seq, rec in rows)
+            elif fmt == "json_array":
+                # Warning: loads into memory; for small files only
+                arr = iter_json_array_small(s3_uri)
+                records = ((src_name, i + offset, r) for i, r in enumerate(arr[offset:]))
+            elif fmt == "csv":
+                # rows carry only the columns; the template supplies the rest of the event
+                template, template_src = load_template_from_package_or_s3(
+                    s3r.get("template_name"), s3r.get("template_s3_uri"), s3r.get("template_inline")
+                )
+                template_event_name = derive_event_name(template_src, None, template)
+                render_row = compile_row_renderer(template, s3r.get("columns") or {}, s3r.get("loan_column") or loan_field)
+                rows = iter_csv_rows(s3_uri, start_offset=offset, delimiter=s3r.get("delimiter") or ",",
+                                     concurrency=concurrency, part_size=part_size)
+
+                def csv_records(rows=rows, src_name=src_name):
+                    for seq, row in rows:
+                        loan, payload = render_row(row, seq)
+                        yield src_name, seq, {loan_field: loan, "eventName": template_event_name, "payload": payload}
+
+                records = csv_records()
+            else:
+                raise ValueError("s3_replay.format must be ndjson, json_array or csv")
+
+        def replay(records=records, prefix=bool(s3_prefix)):
+            # prefix records carry the object key; it goes on the item so rejected messages can be resumed
+            for src, seq, rec in records:
+                loan = extract_loan(rec, loan_field=loan_field)
+                event_name = derive_event_name(os.path.basename(src), explicit_event, rec)
+                yield seq, loan, event_name, rec.get("payload", rec), src if prefix else None
+
+        return replay()
+
+    def _open_template_clone(self, tcfg: Dict[str, Any], explicit_event: Optional[str]) -> Iterator[Tuple[int, str, str, Dict, Optional[str]]]:
+        # Source template: package (lambda_function/samples/), S3, or inline
+        template_name = tcfg.get("template_name") or "Loan_Event_Sample.json"
+        template_s3_uri = tcfg.get("template_s3_uri")
+        template_inline = tcfg.get("template_inline")
+        template, src_name = load_template_from_package_or_s3(template_name, template_s3_uri, template_inline)
+
+        default_event_name = derive_event_name(src_name, explicit_event, template)
+
+        count = int(tcfg.get("count") or 0)
+        if count <= 0:
+            raise ValueError("template_clone.count must be > 0")
+        seq_start = int(tcfg.get("seq_start") or 0)
+        seq_prefix = tcfg.get("sequence_prefix")  # digits string or None
+        loan_rule = (tcfg.get("loan_number_rule") or "derive_per_seq").lower()
+        job_id = self.job_id
+
+        def clones():
+            for i in range(seq_start, seq_start + count):
+                # compute loan number
+                if loan_rule == "derive_per_seq":
+                    loan = generate_loan_number(prefix=seq_prefix or "", seq=i, job_id=job_id)
+                else:
+                    # keep from template; then ensure 10 digits
+                    raw_loan = template.get("loanNumber") or template.get("LoanNumber") or ""
+                    if not raw_loan:
+                        raise ValueError("Template missing loanNumber; set loan_number_rule=derive_per_seq or provide loanNumber in template_inline")
+                    loan = normalize_loan_10(raw_loan)
+
+                # render payload (deep replace placeholders)
+                yield i, loan, default_event_name, render_with_loan(template, loan, i), None
+
+        return clones()
+
+    def items(self) -> Iterator[Tuple[int, dict]]:
+        """Yield (lane_id, item); strict per-loan FIFO comes from hashing each loan to one lane."""
+        for seq, loan, event_name, payload, src in self._records:
+            attrs = dict(self.attrs)
+            attrs.update({"eventName": event_name, "loanNumber": loan})
+            lane_id = stable_hash(loan) % self.lane_count
+            self.submitted += 1
+            item = {"loan": loan, "event_name": event_name, "payload": payload,
+                    "attributes": attrs, "seq": seq, "job": self.name}
+            if src is None:
+                self.next_offset = seq + 1
+            else:
+                item["src"] = src
+            yield lane_id, item
+
+    def cursor(self, rejected: Optional[Dict[Optional[str], int]] = None) -> Dict[str, Any]:
+        """
+        Where to resume: next_offset for single-object sources, next_cursor for s3_prefix.
+        `rejected` maps source key (None for single-object sources) to the lowest seq that an
+        open circuit refused; the cursor is moved back to it so nothing unsent is skipped
+        (messages sent after it in other lanes are sent again: at-least-once).
+        """
+        rejected = rejected or {}
+        next_offset = self.next_offset
+        if None in rejected and next_offset is not None:
+            next_offset = min(next_offset, rejected[None])
+        out: Dict[str, Any] = {"next_offset": next_offset}
+        if self.prefix_reader is None:
+            return out
+        cursor = self.prefix_reader.cursor()
+        by_key = {k: v for k, v in rejected.items() if k is not None}
+        if by_key and self.prefix_reader.order == "merge":
+            offsets = dict((cursor or {}).get("offsets") or {})
+            for key, seq in by_key.items():
+                offsets[key] = min(seq, offsets.get(key, seq))
+            cursor = {"offsets": offsets}
+        elif by_key:
+            key, seq = min(by_key.items())
+            if cursor is None or (key, seq) < (cursor["key"], cursor["offset"]):
+                cursor = {"key": key, "offset": seq}
+        out["next_cursor"] = cursor
+        return out
+
+    def close(self) -> None:
+        if self.prefix_reader is not None:
+            self.prefix_reader.close()
+
+
+def jobs_from_event(event: Dict[str, Any], job_id: str, loan_field: str, lane_count: int,
+                    base_attrs: Dict[str, Any]) -> List[Job]:
+    """A `jobs` list builds one Job per entry; otherwise the event itself is the single job."""
+    jobs_cfg = event.get("jobs")
+    if not jobs_cfg:
+        return [Job(job_id, event, job_id, loan_field, lane_count, base_attrs)]
+    if not isinstance(jobs_cfg, list):
+        raise ValueError("jobs must be a list")
+    jobs: List[Job] = []
+    for n, cfg in enumerate(jobs_cfg):
+        name = str(cfg.get("name") or f"job-{n}")
+        if any(j.name == name for j in jobs):
+            raise ValueError(f"duplicate job name {name!r}")
+        jobs.append(Job(name, cfg, job_id, loan_field, lane_count, base_attrs, weight=cfg.get("weight", 1)))
+    return jobs
+
+
+def weighted_interleave(jobs: List[Job]) -> Iterator[Tuple[Job, int, dict]]:
+    """
+    Smooth weighted round-robin over the jobs' items: every pick adds each job's weight to its
+    credit, the richest job emits one item and pays back the total weight. Weights 4:1 give
+    A A B A A | A A B A A ..., so the mix holds over any short window, not just on average.
+    Exhausted jobs drop out and the rest share their slots.
+    """
+    if len(jobs) == 1:
+        job = jobs[0]
+        for lane_id, item in job.items():
+            yield job, lane_id, item
+        return
+
+    active = [[job, job.items(), 0.0] for job in jobs]
+    total = sum(job.weight for job in jobs)
+    while active:
+        for entry in active:
+            entry[2] += entry[0].weight
+        best = max(active, key=lambda e: e[2])
+        best[2] -= total
+        try:
+            lane_id, item = next(best[1])
+        except StopIteration:
+            active.remove(best)
+            total -= best[0].weight
+            continue
+        yield best[0], lane_id, item
@@ -1,48 +1,118 @@
 import threading
 import queue
 import time
-from typing import Callable, Dict, Tuple
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .circuit import CircuitOpenError
 
 _SENTINEL = object()
+# outcome a buffering publisher reports per message -> counter index (processed, failed, rejected)
+_OUTCOMES = {"ok": 0, "failed": 1, "rejected": 2}
 
 class LaneWorker(threading.Thread):
     def __init__(self, lane_id: int, publisher_factory: Callable[[int], "BaseLanePublisher"]):
         super().__init__(daemon=True, name=f"lane-{lane_id}")
         self.lane_id = lane_id
         self.pub = publisher_factory(lane_id)
-        self.q: "queue.Queue[dict|object]" = queue.Queue(maxsize=10000)
+        # queue entries are lists of items (one put/get per batch, not per message)
+        self.q: "queue.Queue[List[dict]|object]" = queue.Queue(maxsize=2000)
         self.processed = 0
         self.failed = 0
+        self.job_counts: Dict[str, List[int]] = {}  # job name -> [processed, failed, rejected]
+        # messages refused by an open circuit were never sent: lowest seq per (job, source object)
+        self.rejected = 0
+        self.rejected_min: Dict[Tuple[Optional[str], Optional[str]], int] = {}
+        self._deferred: "deque[dict]" = deque()
         self._should_stop = False
 
     def submit(self, item: dict) -> None:
-        self.q.put(item)
+        self.q.put([item])
+
+    def submit_many(self, items: List[dict]) -> None:
+        if items:
+            self.q.put(items)
+
+    def _next_batches(self) -> List[object]:
+        """Block for one entry, then take whatever else is already queued (up to 64 entries)."""
+        batches = [self.q.get()]
+        try:
+            while len(batches) < 64 and batches[-1] is not _SENTINEL:
+                batches.append(self.q.get_nowait())
+        except queue.Empty:
+            pass
+        return batches
 
     def run(self) -> None:
-        while not self._should_stop:
-            item = self.q.get()
-            if item is _SENTINEL:
-                break
-            try:
-                ok = self.pub.send(
-                    loan=item["loan"],
-                    event_name=item["event_name"],
-                    payload=item["payload"],
-                    attributes=item.get("attributes") or {},
-                    seq=item.get("seq") or 0,
-                )
-                if ok:
-                    self.processed += 1
-                else:
-                    self.failed += 1
-            except Exception:
-                self.failed += 1
+        stopping = False
+        while not self._should_stop and not stopping:
+            for batch in self._next_batches():
+                if batch is _SENTINEL:
+                    stopping = True
+                    break
+                for item in batch:
+                    if self._should_stop:
+                        break
+                    if self.rejected:
+                        # an earlier item was refused and will be resent on resume; sending this one
+                        # now would deliver it ahead of that item (per-loan FIFO), so refuse it too
+                        self._count(item, 2)
+                        continue
+                    try:
+                        ok = self.pub.send(
+                            loan=item["loan"],
+                            event_name=item["event_name"],
+                            payload=item["payload"],
+                            attributes=item.get("attributes") or {},
+                            seq=item.get("seq") or 0,
+                        )
+                        outcome = None if ok is None else 0 if ok else 1
+                    except CircuitOpenError:
+                        outcome = 2
+                    except Exception:
+                        outcome = 1
+                    if outcome is None:
+                        self._deferred.append(item)  # buffered by the publisher; counted once settled
+                    else:
+                        self._count(item, outcome)
+                    self._settle()
 
         # flush publisher (e.g., SNS batch leftovers)
+        self._flush()
+
+    def _flush(self) -> None:
         try:
             self.pub.flush()
         except Exception:
             pass
+        self._settle()
+        while self._deferred:  # flush raised before settling these
+            self._count(self._deferred.popleft(), 1)
+
+    def _settle(self) -> None:
+        """Count buffered items whose outcome the publisher has reported (in send order)."""
+        settled = getattr(self.pub, "settled", None)
+        while settled and self._deferred:
+            self._count(self._deferred.popleft(), _OUTCOMES[settled.popleft()])
+
+    def _count(self, item: dict, outcome: int) -> None:
+        job = item.get("job")
+        if outcome == 0:
+            self.processed += 1
+        elif outcome == 1:
+            self.failed += 1
+        else:
+            self._reject(job, item)
+        if job is not None:
+            counts = self.job_counts.get(job) or self.job_counts.setdefault(job, [0, 0, 0])
+            counts[outcome] += 1
+
+    def _reject(self, job: Optional[str], item: dict) -> None:
+        self.rejected += 1
+        key = (job, item.get("src"))
+        seq = item.get("seq") or 0
+        if seq < self.rejected_min.get(key, seq + 1):
+            self.rejected_min[key] = seq
 
     def close(self):
         self.q.put(_SENTINEL)
@@ -54,10 +124,7 @@ class LaneWorker(threading.Thread):
                 self.q.get_nowait()
         except queue.Empty:
             pass
-        try:
-            self.pub.flush()
-        except Exception:
-            pass
+        self._flush()
 
 
 class LaneMux:
@@ -70,6 +137,14 @@ class LaneMux:
     def submit(self, lane_id: int, item: dict) -> None:
         self.lanes[lane_id].submit(item)
 
+    def submit_many(self, items: Iterable[Tuple[int, dict]]) -> None:
+        """Group (lane_id, item) pairs by lane and enqueue one list per lane, keeping input order within a lane."""
+        by_lane: Dict[int, List[dict]] = {}
+        for lane_id, item in items:
+            by_lane.setdefault(lane_id, []).append(item)
+        for lane_id, lane_items in by_lane.items():
+            self.lanes[lane_id].submit_many(lane_items)
+
     def drain_and_close(self, deadline_epoch: float) -> Tuple[int, int]:
         for w in self.lanes:
             w.close()
@@ -80,6 +155,27 @@ class LaneMux:
         failed = sum(w.failed for w in self.lanes)
         return processed, failed
 
+    def job_counts(self) -> Dict[str, Tuple[int, int, int]]:
+        """(processed, failed, rejected) per job name, summed over lanes."""
+        totals: Dict[str, List[int]] = {}
+        for w in self.lanes:
+            for job, counts in list(w.job_counts.items()):
+                t = totals.setdefault(job, [0, 0, 0])
+                for i, n in enumerate(counts):
+                    t[i] += n
+        return {job: (t[0], t[1], t[2]) for job, t in totals.items()}
+
+    def rejected(self) -> Tuple[int, Dict[Optional[str], Dict[Optional[str], int]]]:
+        """Total circuit-rejected messages and, per job, the lowest rejected seq per source object."""
+        total = 0
+        lowest: Dict[Optional[str], Dict[Optional[str], int]] = {}
+        for w in self.lanes:
+            total += w.rejected
+            for (job, src), seq in list(w.rejected_min.items()):
+                per_job = lowest.setdefault(job, {})
+                per_job[src] = min(seq, per_job.get(src, seq))
+        return total, lowest
+
     def force_close(self):
         for w in self.lanes:
             w.force_close()
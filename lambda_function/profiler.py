@@ -0,0 +1,124 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, Optional
+
+# leaf frames in threading.py that mean "blocked, not working" (queue.get, Event.wait, join)
+_IDLE_FUNCS = ("wait", "_wait_for_tstate_lock")
+
+def _thread_group(name: str) -> str:
+    """lane-17 -> lane, s3-prefetch-<key> -> s3-prefetch, s3-range_3 -> s3-range; other names as-is."""
+    for prefix in ("lane-", "s3-prefetch-", "s3-range_"):
+        if name.startswith(prefix):
+            return prefix[:-1]
+    return name
+
+class SamplingProfiler:
+    """
+    Low-overhead wall-clock sampler for the handler and lane threads.
+
+    A daemon thread snapshots sys._current_frames() every interval_s and counts collapsed
+    stacks ("outer;...;inner") and leaf functions. Threads parked in threading waits (idle
+    lanes blocked on queue.get, the handler joining lanes) are counted as idle instead of
+    hot. Overhead is bounded: if a sample takes d seconds, the next one is at least
+    d / max_overhead away, so sampling never costs more than max_overhead of wall time.
+    Optionally traces allocations with tracemalloc (this one is not cheap; opt in separately).
+    """
+
+    def __init__(self, interval_s: float = 0.01, max_overhead: float = 0.02, stack_depth: int = 24,
+                 trace_malloc: bool = False):
+        self.interval_s = max(0.001, float(interval_s))
+        self.max_overhead = min(0.5, max(0.001, float(max_overhead)))
+        self.stack_depth = max(1, int(stack_depth))
+        self.trace_malloc = trace_malloc
+        self.stacks: Counter = Counter()
+        self.leaves: Counter = Counter()
+        self.threads: Counter = Counter()
+        self.samples = 0
+        self.idle = 0
+        self.sample_cost_s = 0.0
+        self._started_at = 0.0
+        self._stopped_at = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._own_tracemalloc = False
+        self._malloc_snapshot = None
+
+    def start(self) -> "SamplingProfiler":
+        if self.trace_malloc and not tracemalloc.is_tracing():
+            tracemalloc.start(self.stack_depth)
+            self._own_tracemalloc = True
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="profiler")
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._thread is None or self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+        self._stopped_at = time.perf_counter()
+        if self.trace_malloc and tracemalloc.is_tracing():
+            self._malloc_snapshot = tracemalloc.take_snapshot()
+            if self._own_tracemalloc:
+                tracemalloc.stop()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.is_set():
+            t0 = time.perf_counter()
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    self._record(names.get(ident, "?"), frame)
+            self.samples += 1
+            cost = time.perf_counter() - t0
+            self.sample_cost_s += cost
+            self._stop.wait(max(self.interval_s, cost / self.max_overhead))
+
+    def _record(self, thread_name: str, frame) -> None:
+        code = frame.f_code
+        if code.co_name in _IDLE_FUNCS and os.path.basename(code.co_filename) == "threading.py":
+            self.idle += 1
+            return
+        self.threads[_thread_group(thread_name)] += 1
+        parts = []
+        f = frame
+        while f is not None and len(parts) < self.stack_depth:
+            c = f.f_code
+            parts.append(f"{os.path.basename(c.co_filename)}:{c.co_name}")
+            f = f.f_back
+        self.leaves[f"{parts[0]}:{frame.f_lineno}"] += 1
+        self.stacks[";".join(reversed(parts))] += 1
+
+    def summary(self, top_n: int = 15) -> Dict[str, Any]:
+        wall = max((self._stopped_at or time.perf_counter()) - self._started_at, 1e-6)
+        busy = max(sum(self.stacks.values()), 1)
+        out: Dict[str, Any] = {
+            "samples": self.samples,
+            "interval_ms": round(self.interval_s * 1000, 2),
+            "overhead_pct": round(100.0 * self.sample_cost_s / wall, 2),
+            "busy_thread_samples": sum(self.stacks.values()),
+            "idle_thread_samples": self.idle,
+            "threads": dict(self.threads.most_common()),
+            "top_functions": [
+                {"frame": k, "count": n, "pct": round(100.0 * n / busy, 1)} for k, n in self.leaves.most_common(top_n)
+            ],
+            "top_stacks": [
+                {"stack": k, "count": n, "pct": round(100.0 * n / busy, 1)} for k, n in self.stacks.most_common(top_n)
+            ],
+        }
+        if self._malloc_snapshot is not None:
+            stats = self._malloc_snapshot.statistics("lineno")[:top_n]
+            out["top_allocations"] = [
+                {"frame": f"{os.path.basename(s.traceback[0].filename)}:{s.traceback[0].lineno}",
+                 "size_kb": round(s.size / 1024, 1), "count": s.count}
+                for s in stats
+            ]
+        return out
@@ -1,16 +1,25 @@
 import json
 import time
 import random
-from typing import Dict
+from typing import Dict, Optional
 import urllib3
 
+from .circuit import CircuitBreaker, CircuitOpenError
+
+def build_body(loan: str, event_name: str, payload: Dict) -> bytes:
+    """Wire body for /sendMessage: { "loanNumber", "eventName", "payload" } as UTF-8 JSON."""
+    return json.dumps({"loanNumber": loan, "eventName": event_name, "payload": payload}).encode("utf-8")
+
 class SubmitterHttpPublisher:
     """
     Sequential per-lane sender to /sendMessage.
     Body: { "loanNumber": "<10 digits>", "eventName": "<derived>", "payload": {...} }
+    With a shared breaker, every attempt is recorded and no attempt (or retry) is made while
+    the circuit is open: send raises CircuitOpenError and the message stays unsent.
     """
 
-    def __init__(self, base_url: str, path: str = "/sendMessage", max_pool: int = 256, timeout_s: float = 3.0):
+    def __init__(self, base_url: str, path: str = "/sendMessage", max_pool: int = 256, timeout_s: float = 3.0,
+                 breaker: Optional[CircuitBreaker] = None):
         normalized_base = base_url.rstrip("/")
         normalized_path = path.lstrip("/") if path is not None else ""
         if normalized_path:
@@ -20,31 +29,37 @@ class SubmitterHttpPublisher:
         self.pool = urllib3.PoolManager(
             num_pools=max_pool, maxsize=max_pool, timeout=urllib3.Timeout(total=timeout_s, connect=1.0, read=timeout_s), retries=False
         )
+        self.breaker = breaker
 
     def send(self, loan: str, event_name: str, payload: Dict, attributes: Dict, seq: int) -> bool:
         # Merge attributes into payload or top-level? Requirement: endpoint takes loanNumber, eventName, payload.
-        body = {"loanNumber": loan, "eventName": event_name, "payload": payload}
-        data = json.dumps(body).encode("utf-8")
+        data = build_body(loan, event_name, payload)
 
         # Retry on 5xx/429/timeouts up to 3x
+        breaker = self.breaker
         attempts = 0
         while True:
             attempts += 1
+            if breaker is not None and not breaker.allow():
+                raise CircuitOpenError(self.url)
             try:
                 resp = self.pool.request("POST", self.url, body=data, headers={"Content-Type": "application/json"})
                 status = resp.status
-                if 200 <= status < 300:
-                    return True
-                if status in (429, 500, 502, 503, 504):
-                    if attempts <= 3:
-                        time.sleep(min(0.5 * attempts + random.random() * 0.2, 2.0))
-                        continue
-                return False
             except Exception:
-                if attempts <= 3:
-                    time.sleep(min(0.5 * attempts + random.random() * 0.2, 2.0))
-                    continue
-                return False
+                status = None
+            retryable = status is None or status in (429, 500, 502, 503, 504)
+            if breaker is not None:
+                # other 4xx mean the endpoint is up and rejected this message
+                if retryable:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+            if status is not None and 200 <= status < 300:
+                return True
+            if retryable and attempts <= 3:
+                time.sleep(min(0.5 * attempts + random.random() * 0.2, 2.0))
+                continue
+            return False
 
     def flush(self):
         return
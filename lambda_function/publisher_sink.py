@@ -0,0 +1,92 @@
+import os
+import struct
+import threading
+from typing import Dict, Optional
+
+from .publisher_http import build_body
+
+class NullLanePublisher:
+    """
+    Serializes the /sendMessage wire body and discards it. Measures the producer side
+    (S3 read, parse, render, lane dispatch) without any network cost.
+    """
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def send(self, loan: str, event_name: str, payload: Dict, attributes: Dict, seq: int) -> bool:
+        self.bytes += len(build_body(loan, event_name, payload))
+        self.messages += 1
+        return True
+
+    def flush(self):
+        return
+
+
+class FileSink:
+    """
+    Shared local file that lane publishers append to in large chunks.
+    - ndjson: one wire body per line (replayable with S3_REPLAY format=ndjson)
+    - length_prefixed: 4-byte big-endian length + wire body
+    """
+
+    def __init__(self, path: str, fmt: str = "ndjson", buffer_bytes: int = 1 << 20):
+        if fmt not in ("ndjson", "length_prefixed"):
+            raise ValueError("file.format must be ndjson or length_prefixed")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.fmt = fmt
+        self.buffer_bytes = max(4096, int(buffer_bytes))
+        self.lock = threading.Lock()
+        self.bytes_written = 0
+        self.bytes_dropped = 0  # frames flushed by a lane after close (lane outlived the drain)
+        self._f = open(path, "wb", buffering=self.buffer_bytes)
+
+    def frame(self, body: bytes) -> bytes:
+        if self.fmt == "ndjson":
+            return body + b"\n"
+        return struct.pack(">I", len(body)) + body
+
+    def write(self, chunk: bytes) -> None:
+        with self.lock:
+            if self._f.closed:
+                self.bytes_dropped += len(chunk)
+                return
+            self._f.write(chunk)
+            self.bytes_written += len(chunk)
+
+    def close(self) -> None:
+        with self.lock:
+            if not self._f.closed:
+                self._f.close()
+
+
+class FileLanePublisher:
+    """
+    Per-lane writer into a shared FileSink. Frames accumulate in a small lane-local buffer and are
+    appended under the sink lock once it reaches buffer_bytes, so each loan's events keep
+    their lane order in the file. The large buffer lives on the shared file; by default each
+    lane gets sink.buffer_bytes // lane_count (at least 8 KiB) so memory does not scale with lanes.
+    """
+
+    def __init__(self, sink: FileSink, buffer_bytes: Optional[int] = None, lane_count: int = 1):
+        self.sink = sink
+        self.buffer_bytes = buffer_bytes or max(8192, sink.buffer_bytes // max(1, lane_count))
+        self.buf = bytearray()
+        self.messages = 0
+        self.bytes = 0
+
+    def send(self, loan: str, event_name: str, payload: Dict, attributes: Dict, seq: int) -> bool:
+        body = build_body(loan, event_name, payload)
+        self.buf += self.sink.frame(body)
+        self.bytes += len(body)
+        self.messages += 1
+        if len(self.buf) >= self.buffer_bytes:
+            self.flush()
+        return True
+
+    def flush(self):
+        data, self.buf = self.buf, bytearray()
+        if data:
+            self.sink.write(bytes(data))
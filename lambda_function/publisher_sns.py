@@ -2,20 +2,32 @@ import json
 import time
 import random
 import uuid
-from typing import Dict, List
+from collections import deque
+from typing import Dict, List, Optional
 
 import boto3
 from botocore.config import Config
 
+from .circuit import CircuitBreaker, CircuitOpenError
+
 class SnsLanePublisher:
     """
     Per-lane publisher with simple batching. Preserves order per loan by design (lane serializes work).
+    send() returns None for a buffered message: its outcome ("ok", "failed" or "rejected") is appended
+    to `settled` once its batch is done, in send order, so the lane counts it only then.
+    With a shared breaker: while the circuit is open new messages raise CircuitOpenError; the message
+    that gets the half-open probe is flushed at once (with anything still buffered) so the probe
+    resolves; batches stop retrying when the circuit opens and their unsent entries, plus everything
+    buffered behind them, settle as "rejected" (never sent, resumable), while entries that exhaust
+    their retries settle as "failed".
     """
 
-    def __init__(self, topic_arn: str, batch_size: int = 10):
+    def __init__(self, topic_arn: str, batch_size: int = 10, breaker: Optional[CircuitBreaker] = None):
         self.topic_arn = topic_arn
+        self.breaker = breaker
         self.batch_size = max(1, min(10, batch_size))
         self.pending: List[Dict] = []
+        self.settled: "deque[str]" = deque()
         self.sns = boto3.client(
             "sns",
             config=Config(
@@ -26,7 +38,7 @@ class SnsLanePublisher:
             ),
         )
 
-    def send(self, loan: str, event_name: str, payload: Dict, attributes: Dict, seq: int) -> bool:
+    def send(self, loan: str, event_name: str, payload: Dict, attributes: Dict, seq: int) -> Optional[bool]:
         msg = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
         if len(msg.encode("utf-8")) > 256_000:
             # Too big for SNS; starter code: drop with failure. (Or route to pointer if you enable it)
@@ -41,44 +53,66 @@ class SnsLanePublisher:
             "MessageDeduplicationId": dedup,
             "MessageAttributes": msg_attrs,
         }
+        breaker = self.breaker
+        if breaker is not None and breaker.is_open:
+            if not breaker.allow():
+                raise CircuitOpenError(self.topic_arn)
+            self.pending.append(entry)
+            self._flush_batch(probe=True)
+            return None
         self.pending.append(entry)
         if len(self.pending) >= self.batch_size:
-            return self._flush_batch()
-        return True
+            self._flush_batch()
+        return None
 
-    def _flush_batch(self) -> bool:
+    def _flush_batch(self, probe: bool = False) -> bool:
         if not self.pending:
             return True
         batch = self.pending[:10]
-        ok = False
+        unsent = batch
+        breaker = self.breaker
+        gave_up = "failed"
         attempts = 0
         while True:
             attempts += 1
+            # a probe already holds the breaker's permission for its first attempt
+            if breaker is not None and not (probe and attempts == 1) and not breaker.allow():
+                gave_up = "rejected"
+                break
             try:
-                resp = self.sns.publish_batch(TopicArn=self.topic_arn, PublishBatchRequestEntries=batch)
+                resp = self.sns.publish_batch(TopicArn=self.topic_arn, PublishBatchRequestEntries=unsent)
                 failed = resp.get("Failed") or []
-                if not failed:
-                    ok = True
-                    break
+                if breaker is not None:
+                    if len(failed) < len(unsent):
+                        breaker.record_success()
+                    else:
+                        breaker.record_failure()
                 # retry failed entries only
                 retry_ids = {f["Id"] for f in failed}
-                batch = [e for e in batch if e["Id"] in retry_ids]
-                if attempts > 3:
-                    ok = False
+                unsent = [e for e in unsent if e["Id"] in retry_ids]
+                if not unsent or attempts > 3:
                     break
                 time.sleep(min(0.5 * attempts + random.random() * 0.2, 2.0))
             except Exception:
+                if breaker is not None:
+                    breaker.record_failure()
                 if attempts > 3:
-                    ok = False
                     break
                 time.sleep(min(0.5 * attempts + random.random() * 0.2, 2.0))
-        # remove flushed entries from pending
-        flushed_ids = {e["Id"] for e in self.pending[: len(self.pending) if len(self.pending) <= 10 else 10]}
-        self.pending = [e for e in self.pending if e["Id"] not in flushed_ids]
-        return ok
+        # settle the batch in send order and remove it from pending
+        unsent_ids = {e["Id"] for e in unsent}
+        self.settled.extend(gave_up if e["Id"] in unsent_ids else "ok" for e in batch)
+        del self.pending[: len(batch)]
+        if gave_up == "rejected" and unsent:
+            # entries buffered behind a rejected one must not overtake it: reject them unsent
+            self.settled.extend("rejected" for _ in self.pending)
+            self.pending.clear()
+        return not unsent
 
     def flush(self):
         while self.pending:
             if not self._flush_batch():
-                # give up to avoid infinite loop
-                break
+                # give up on the rest without retrying each batch; it settles like the batch that failed
+                outcome = "rejected" if self.breaker is not None and self.breaker.is_open else "failed"
+                self.settled.extend(outcome for _ in self.pending)
+                self.pending.clear()
@@ -1,42 +1,61 @@
+import csv
 import json
-import gzip
-from typing import Iterator, Tuple, Dict
+import heapq
+import queue
+import random
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 import boto3
 from urllib.parse import urlparse
 
+# read-ahead part size for parallel ranged GETs (memory ~ (concurrency + 1) * part size)
+DEFAULT_PART_SIZE = 8 << 20
+
 def parse_s3_uri(s3_uri: str) -> Tuple[str, str]:
     u = urlparse(s3_uri)
     if u.scheme != "s3":
         raise ValueError("s3_uri must start with s3://")
     return u.netloc, u.path.lstrip("/")
 
-def iter_ndjson(s3_uri: str, start_offset: int = 0) -> Iterator[Tuple[int, Dict]]:
-    """Stream NDJSON from S3. Supports gzip if ContentEncoding=gzip or key endswith .gz."""
+def iter_ndjson(s3_uri: str, start_offset: int = 0, concurrency: int = 1,
+                part_size: int = DEFAULT_PART_SIZE) -> Iterator[Tuple[int, Dict]]:
+    """
+    Stream NDJSON from S3. Supports gzip if ContentEncoding=gzip or key endswith .gz.
+    With concurrency > 1, objects larger than part_size are read ahead as parallel ranged GETs.
+    """
     s3 = boto3.client("s3")
     bucket, key = parse_s3_uri(s3_uri)
-    obj = s3.get_object(Bucket=bucket, Key=key)
-    body = obj["Body"]
+    lines = iter_object_lines(s3, bucket, key, concurrency=concurrency, part_size=part_size)
+    for idx, (_, _, raw) in enumerate(lines):
+        if idx < start_offset:
+            continue
+        if not raw.strip():
+            continue
+        yield (idx, json.loads(raw))
 
-    # Decide gzip
-    is_gz = obj.get("ContentEncoding", "") == "gzip" or key.endswith(".gz")
+def iter_csv_rows(s3_uri: str, start_offset: int = 0, delimiter: str = ",", concurrency: int = 1,
+                  part_size: int = DEFAULT_PART_SIZE) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Stream CSV rows from S3 as dicts keyed by the header row; the index counts data rows only."""
+    s3 = boto3.client("s3")
+    bucket, key = parse_s3_uri(s3_uri)
 
-    if is_gz:
-        # Download then stream (starter approach)
-        data = body.read()
-        for idx, line in enumerate(gzip.decompress(data).splitlines()):
-            if idx < start_offset:
-                continue
-            if not line:
-                continue
-            yield (idx, json.loads(line))
-    else:
-        # Streaming lines
-        for idx, raw in enumerate(body.iter_lines()):
-            if idx < start_offset:
-                continue
-            if not raw:
-                continue
-            yield (idx, json.loads(raw))
+    def lines() -> Iterator[str]:
+        first = True
+        for _, _, raw in iter_object_lines(s3, bucket, key, concurrency=concurrency, part_size=part_size):
+            text = raw.decode("utf-8")
+            if first:
+                text = text.lstrip("\ufeff")
+                first = False
+            yield text + "\n"
+
+    for idx, row in enumerate(csv.DictReader(lines(), delimiter=delimiter)):
+        if idx < start_offset:
+            continue
+        yield (idx, row)
 
 def iter_json_array_small(s3_uri: str):
     """For small files only; loads whole array."""
@@ -45,3 +64,336 @@ def iter_json_array_small(s3_uri: str):
     obj = s3.get_object(Bucket=bucket, Key=key)
     data = obj["Body"].read()
     return json.loads(data)
+
+def list_prefix_keys(s3_prefix_uri: str, s3=None) -> Tuple[str, List[str]]:
+    """List non-empty object keys under an s3://bucket/prefix URI, sorted by key."""
+    s3 = s3 or boto3.client("s3")
+    bucket, prefix = parse_s3_uri(s3_prefix_uri)
+    keys: List[str] = []
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for o in page.get("Contents") or []:
+            if o["Key"].endswith("/") or not o.get("Size"):
+                continue
+            keys.append(o["Key"])
+    keys.sort()
+    return bucket, keys
+
+def _is_invalid_range(exc: Exception) -> bool:
+    err = getattr(exc, "response", None) or {}
+    return (err.get("Error") or {}).get("Code") == "InvalidRange"
+
+# error codes worth retrying a ranged GET for; anything else (AccessDenied, NoSuchKey, ...) fails at once
+_RETRYABLE_CODES = {"SlowDown", "Throttling", "ThrottlingException", "RequestTimeout",
+                    "RequestLimitExceeded", "InternalError", "ServiceUnavailable"}
+
+def _range_error_kind(exc: Exception) -> str:
+    """'changed' (ETag no longer matches), 'retry' (throttled, 5xx, connection) or 'fatal'."""
+    err = getattr(exc, "response", None)
+    if not isinstance(err, dict):
+        return "retry"  # connection / read errors carry no S3 response
+    code = (err.get("Error") or {}).get("Code")
+    status = (err.get("ResponseMetadata") or {}).get("HTTPStatusCode") or 0
+    if code == "PreconditionFailed" or status == 412:
+        return "changed"
+    if code in _RETRYABLE_CODES or status == 429 or status >= 500:
+        return "retry"
+    return "fatal"
+
+def _split_lines(chunks: Iterable[bytes], pos: int) -> Iterator[Tuple[int, int, bytes]]:
+    """Split a byte stream into lines, yielding (start_offset, end_offset, line)."""
+    pending = b""
+    for chunk in chunks:
+        buf = pending + chunk if pending else chunk
+        start = 0
+        while True:
+            nl = buf.find(b"\n", start)
+            if nl < 0:
+                break
+            yield pos, pos + nl + 1 - start, buf[start:nl]
+            pos += nl + 1 - start
+            start = nl + 1
+        pending = buf[start:]
+    if pending:
+        yield pos, pos + len(pending), pending
+
+def _gunzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Streaming gunzip that also handles multi-member (concatenated) files."""
+    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        while chunk:
+            out = d.decompress(chunk)
+            if out:
+                yield out
+            if not d.eof:
+                break
+            chunk = d.unused_data
+            d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    tail = d.flush()
+    if tail:
+        yield tail
+
+def iter_ranges_parallel(s3, bucket: str, key: str, begin: int, end: int, part_size: int = DEFAULT_PART_SIZE,
+                         concurrency: int = 8, etag: Optional[str] = None) -> Iterator[bytes]:
+    """
+    Fetch bytes [begin, end) of an object as part_size ranged GETs with at most `concurrency`
+    in flight, yielding parts strictly in order. A new GET starts only when the oldest part is
+    handed out, so memory stays around (concurrency + 1) * part_size. IfMatch pins every part
+    to the same object version; if the object is replaced mid-read the GET fails with 412 and
+    that is raised at once. Throttling, 5xx and connection errors are retried with jitter.
+    """
+    extra = {"IfMatch": etag} if etag else {}
+
+    def fetch(lo: int, hi: int) -> bytes:
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                obj = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={lo}-{hi - 1}", **extra)
+                return obj["Body"].read()
+            except Exception as e:
+                kind = _range_error_kind(e)
+                if kind == "changed":
+                    raise RuntimeError(f"s3://{bucket}/{key} changed while it was being read (ETag no longer "
+                                       f"matches {etag}); restart from the last cursor") from e
+                if kind == "fatal" or attempts >= 3:
+                    raise
+                time.sleep(min(0.5 * attempts + random.random() * 0.2, 2.0))
+
+    starts = iter(range(begin, end, part_size))
+    inflight: "deque" = deque()
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="s3-range")
+
+    def submit_next() -> None:
+        lo = next(starts, None)
+        if lo is not None:
+            inflight.append(pool.submit(fetch, lo, min(lo + part_size, end)))
+
+    try:
+        for _ in range(max(1, concurrency)):
+            submit_next()
+        while inflight:
+            data = inflight.popleft().result()
+            submit_next()
+            yield data
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _lines_from_chunks(chunks: Iterable[bytes], is_gz: bool, start_offset: int,
+                       chunks_begin: int) -> Iterator[Tuple[int, int, bytes]]:
+    if is_gz:
+        for start, end, line in _split_lines(_gunzip_chunks(chunks), 0):
+            if start >= start_offset:
+                yield start, end, line
+    else:
+        yield from _split_lines(chunks, chunks_begin)
+
+def iter_object_lines(s3, bucket: str, key: str, start_offset: int = 0, chunk_size: int = 1 << 20,
+                      concurrency: int = 1, part_size: int = DEFAULT_PART_SIZE) -> Iterator[Tuple[int, int, bytes]]:
+    """
+    Stream one object as (start_offset, end_offset, line). Offsets are byte positions in the
+    (decompressed) stream, so they can be stored in a cursor and passed back as start_offset.
+    Plain objects resume with a ranged GET; gzip objects are re-read and skipped forward.
+    With concurrency > 1, objects with more than part_size bytes left are read through
+    iter_ranges_parallel; lines that straddle part boundaries are stitched by _split_lines.
+    """
+    is_gz = key.endswith(".gz")
+    if concurrency > 1:
+        head = s3.head_object(Bucket=bucket, Key=key)
+        size = int(head.get("ContentLength") or 0)
+        is_gz = is_gz or head.get("ContentEncoding", "") == "gzip"
+        begin = 0 if is_gz else start_offset
+        if begin >= size:
+            return  # cursor already at end of object
+        if size - begin > part_size:
+            chunks = iter_ranges_parallel(s3, bucket, key, begin, size, part_size=part_size,
+                                          concurrency=concurrency, etag=head.get("ETag"))
+            yield from _lines_from_chunks(chunks, is_gz, start_offset, begin)
+            return
+
+    kwargs = {"Range": f"bytes={start_offset}-"} if start_offset and not is_gz else {}
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=key, **kwargs)
+    except Exception as e:
+        if kwargs and _is_invalid_range(e):
+            return  # cursor already at end of object
+        raise
+    if obj.get("ContentEncoding", "") == "gzip" and not is_gz:
+        is_gz = True
+        if kwargs:
+            obj = s3.get_object(Bucket=bucket, Key=key)
+    body = obj["Body"]
+    chunks = iter(lambda: body.read(chunk_size), b"")
+    yield from _lines_from_chunks(chunks, is_gz, start_offset, start_offset if kwargs else 0)
+
+_EOF = object()
+
+class _ObjectStream:
+    """Reads one object on a background thread into a bounded queue of parsed records."""
+
+    def __init__(self, s3, bucket: str, key: str, start_offset: int, max_buffered: int):
+        self.key = key
+        self.offset = start_offset  # end offset of the last record handed to the consumer
+        self.finished = False
+        self._args = (s3, bucket, key, start_offset)
+        self._q: "queue.Queue" = queue.Queue(maxsize=max_buffered)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"s3-prefetch-{key}")
+
+    def start(self) -> "_ObjectStream":
+        self._thread.start()
+        return self
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._q.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self) -> None:
+        try:
+            for start, end, line in iter_object_lines(*self._args):
+                if not line.strip():
+                    continue
+                if not self._put((start, end, json.loads(line))):
+                    return
+            self._put(_EOF)
+        except Exception as e:  # surface reader errors on the consumer side
+            self._put(e)
+
+    def __iter__(self) -> Iterator[Tuple[int, int, Dict]]:
+        while True:
+            item = self._q.get()
+            if item is _EOF:
+                self.finished = True
+                return
+            if isinstance(item, Exception):
+                raise item
+            start, end, rec = item
+            self.offset = end
+            yield start, end, rec
+
+    def close(self) -> None:
+        self._stop.set()
+
+class S3PrefixReader:
+    """
+    Replay every NDJSON object under an S3 prefix.
+
+    - order="key": objects are consumed one after another in key order while the next
+      `prefetch` objects are already streaming in the background (bounded reader pool).
+    - order="merge": all objects are open at once (one reader thread and S3 connection each)
+      and k-way merged on `merge_field` (each part file must already be sorted on that field),
+      so per-loan FIFO holds across files. At most `max_merge_objects` objects are accepted and
+      `max_buffered` records are shared between them (at least 16 per object).
+
+    `records()` yields (key, seq, record) where seq is the record's byte offset in its
+    object. `cursor()` describes the position after the last yielded record, or None once
+    every object has been consumed. Pass it back as `cursor=` to resume.
+      key order:   {"key": <object key>, "offset": <byte offset>}
+      merge order: {"offsets": {<object key>: <byte offset>, ...}}  (finished objects omitted)
+    """
+
+    def __init__(self, s3_prefix_uri: str, order: str = "key", merge_field: Optional[str] = None,
+                 prefetch: int = 4, max_buffered: int = 2000, cursor: Optional[Dict] = None, s3=None,
+                 max_merge_objects: int = 256):
+        if order not in ("key", "merge"):
+            raise ValueError("s3_replay.order must be key or merge")
+        if order == "merge" and not merge_field:
+            raise ValueError("s3_replay.merge_field is required when order=merge")
+        self.s3 = s3 or boto3.client("s3")
+        self.order = order
+        self.merge_field = merge_field
+        self.prefetch = max(1, int(prefetch))
+        self.max_buffered = max(1, int(max_buffered))
+        self.bucket, keys = list_prefix_keys(s3_prefix_uri, s3=self.s3)
+
+        cursor = cursor or {}
+        self.start_offsets: Dict[str, int] = {k: 0 for k in keys}
+        if "offsets" in cursor:
+            self.start_offsets = {k: int(v) for k, v in cursor["offsets"].items() if k in self.start_offsets}
+        elif cursor.get("key"):
+            ck = cursor["key"]
+            self.start_offsets = {k: 0 for k in keys if k >= ck}
+            if ck in self.start_offsets:
+                self.start_offsets[ck] = int(cursor.get("offset") or 0)
+        self.keys = sorted(self.start_offsets)
+        if order == "merge":
+            if len(self.keys) > max_merge_objects:
+                raise ValueError(
+                    f"order=merge opens every object at once; {len(self.keys)} objects exceed "
+                    f"max_merge_objects={max_merge_objects}"
+                )
+            self.max_buffered = max(16, self.max_buffered // max(1, len(self.keys)))
+        # merge order: end offset of the last record actually yielded per key, and finished keys
+        self._consumed: Dict[str, int] = dict(self.start_offsets)
+        self._merge_done: set = set()
+        self._streams: List[_ObjectStream] = []
+        self._current: Optional[_ObjectStream] = None
+        self._done = not self.keys
+
+    def _open(self, key: str) -> _ObjectStream:
+        s = _ObjectStream(self.s3, self.bucket, key, self.start_offsets[key], self.max_buffered).start()
+        self._streams.append(s)
+        return s
+
+    def records(self) -> Iterator[Tuple[str, int, Dict]]:
+        try:
+            if self.order == "merge":
+                yield from self._merged()
+            else:
+                yield from self._in_key_order()
+            self._done = True
+        finally:
+            self.close()
+
+    def _in_key_order(self) -> Iterator[Tuple[str, int, Dict]]:
+        window: "deque[_ObjectStream]" = deque()
+        pending = deque(self.keys)
+        while pending or window:
+            while pending and len(window) < self.prefetch:
+                window.append(self._open(pending.popleft()))
+            self._current = window.popleft()
+            for seq, _, rec in self._current:
+                yield self._current.key, seq, rec
+            self._current.close()
+
+    def _merged(self) -> Iterator[Tuple[str, int, Dict]]:
+        field = self.merge_field
+
+        def keyed(n: int, stream: _ObjectStream):
+            for seq, end, rec in stream:
+                if field not in rec:
+                    raise ValueError(f"merge field '{field}' missing in {stream.key} at byte {seq}")
+                # object index breaks ties so equal timestamps keep key order
+                yield (rec[field], n, seq), stream.key, end, rec
+            # only reached once every record of this object has been yielded by the merge
+            self._merge_done.add(stream.key)
+
+        streams = [self._open(k) for k in self.keys]
+        merged = heapq.merge(*(keyed(n, s) for n, s in enumerate(streams)), key=lambda t: t[0])
+        # heapq.merge holds one pulled record per object, so the stream offsets run ahead of
+        # what the consumer has seen; the cursor uses the offsets of yielded records instead
+        for (_, _, seq), key, end, rec in merged:
+            self._consumed[key] = end
+            yield key, seq, rec
+
+    def cursor(self) -> Optional[Dict[str, Any]]:
+        if self._done:
+            return None
+        if self.order == "merge":
+            return {"offsets": {k: v for k, v in self._consumed.items() if k not in self._merge_done}}
+        cur = self._current
+        if cur is None:
+            return {"key": self.keys[0], "offset": self.start_offsets[self.keys[0]]}
+        if cur.finished:
+            later = [k for k in self.keys if k > cur.key]
+            return {"key": later[0], "offset": self.start_offsets[later[0]]} if later else None
+        return {"key": cur.key, "offset": cur.offset}
+
+    def close(self) -> None:
+        for s in self._streams:
+            s.close()
@@ -1,7 +1,12 @@
 import json
+import math
 import os
-from typing import Any, Dict, Tuple, Optional
-from .util import normalize_loan_10, generate_loan_number
+import re
+from typing import Any, Callable, Dict, List, Tuple, Optional, Union
+from .util import extract_loan, normalize_loan_10, generate_loan_number
+
+# Accept both misspelling and correct placeholder
+LOAN_PLACEHOLDERS = ("#loanNumberPlacehoder", "#loanNumberPlaceholder", "{loanNumber}")
 
 def load_template_from_package_or_s3(template_name: Optional[str] = None, 
                                      template_s3_uri: Optional[str] = None, 
@@ -59,3 +64,118 @@ def render_with_loan(template: Dict[str, Any], loan: str, seq: int) -> Dict[str,
     t = _deep_replace(t, "{seq}", str(seq))
     t = _deep_replace(t, "{loanNumber}", loan)
     return t
+
+def _json_fragment(value: Any, raw: bool) -> str:
+    if raw:
+        # raw tokens replace a whole JSON string, e.g. "{balance}" -> 250000; only numbers
+        # (already parsed) are spliced so cell text can never become JSON structure
+        if value is None:
+            return "null"
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise TypeError(f"raw template values must be finite numbers, got {value!r}")
+        return json.dumps(value)
+    return json.dumps("" if value is None else str(value), ensure_ascii=False)[1:-1]
+
+def parse_number(text: Optional[str]) -> Optional[Union[int, float]]:
+    """CSV cell -> int, else float; empty -> None. Raises ValueError for anything else, NaN and inf included."""
+    text = (text or "").strip()
+    if not text:
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    value = float(text)
+    if not math.isfinite(value):
+        raise ValueError(f"not a finite number: {text!r}")
+    return value
+
+def compile_template(template: Dict[str, Any], tokens: List[str],
+                     raw_tokens: Optional[List[str]] = None) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Serialize the template once and split it on placeholder tokens. The returned render(values)
+    only splices escaped values into the pre-split text and parses it, instead of walking the
+    whole structure per token like render_with_loan. Tokens in raw_tokens must fill an entire
+    JSON string ("{balance}") and take already-parsed numbers (or None -> null), so numbers
+    stay numbers.
+    """
+    text = json.dumps(template, separators=(",", ":"), ensure_ascii=False)
+    patterns: Dict[str, Tuple[str, bool]] = {}
+    for t in tokens:
+        patterns[json.dumps(t, ensure_ascii=False)[1:-1]] = (t, False)
+    for t in raw_tokens or ():
+        patterns[json.dumps(t, ensure_ascii=False)] = (t, True)
+    if not patterns:
+        return lambda values: json.loads(text)
+
+    regex = re.compile("|".join(re.escape(p) for p in sorted(patterns, key=len, reverse=True)))
+    pieces: List[Union[str, Tuple[str, bool]]] = []
+    pos = 0
+    for m in regex.finditer(text):
+        pieces.append(text[pos:m.start()])
+        pieces.append(patterns[m.group(0)])
+        pos = m.end()
+    pieces.append(text[pos:])
+
+    def render(values: Dict[str, Any]) -> Dict[str, Any]:
+        return json.loads("".join(
+            p if isinstance(p, str) else _json_fragment(values.get(p[0]), p[1]) for p in pieces
+        ))
+
+    return render
+
+def compile_row_renderer(template: Dict[str, Any], columns: Dict[str, Any],
+                         loan_column: str = "loanNumber") -> Callable[[Dict[str, str], int], Tuple[str, Dict[str, Any]]]:
+    """
+    Build render(row, seq) -> (loan, payload) for CSV rows joined onto a template.
+    columns maps placeholder token -> CSV column name, or -> {"column": name, "type": "string" | "number"}.
+    Loan placeholders and {seq} are filled the same way as render_with_loan. The first row is
+    checked against the mapped columns and loan_column, so a misspelled column fails the run
+    instead of rendering blanks.
+    """
+    mapping: List[Tuple[str, str]] = []
+    raw_tokens: List[str] = []
+    for token, spec in (columns or {}).items():
+        if isinstance(spec, dict):
+            col = spec.get("column")
+            kind = (spec.get("type") or "string").lower()
+        else:
+            col, kind = spec, "string"
+        if not col:
+            raise ValueError(f"s3_replay.columns[{token!r}] needs a column name")
+        if kind not in ("string", "number"):
+            raise ValueError("s3_replay.columns type must be string or number")
+        mapping.append((token, col))
+        if kind == "number":
+            raw_tokens.append(token)
+
+    string_tokens = list(LOAN_PLACEHOLDERS) + ["{seq}"] + [t for t, _ in mapping if t not in raw_tokens]
+    render = compile_template(template, string_tokens, raw_tokens)
+    mapping_by_token = dict(mapping)
+    required = [loan_column] + [col for _, col in mapping if col != loan_column]
+    header_checked = False
+
+    def render_row(row: Dict[str, str], seq: int) -> Tuple[str, Dict[str, Any]]:
+        nonlocal header_checked
+        if not header_checked:
+            # DictReader rows carry every header field, so the first row shows what the file has
+            missing = [col for col in dict.fromkeys(required) if col not in row]
+            if missing:
+                header = [k for k in row if k is not None]
+                raise ValueError(f"CSV header is missing column(s) {missing} named by s3_replay.columns/loan_column; "
+                                 f"header is {header}")
+            header_checked = True
+        loan = extract_loan(row, loan_field=loan_column)
+        values: Dict[str, Any] = {t: row.get(col) for t, col in mapping}
+        for t in raw_tokens:
+            col = mapping_by_token[t]
+            try:
+                values[t] = parse_number(values[t])
+            except ValueError:
+                raise ValueError(f"CSV row {seq}: column {col!r} is not a number: {values[t]!r}") from None
+        for t in LOAN_PLACEHOLDERS:
+            values[t] = loan
+        values["{seq}"] = str(seq)
+        return loan, render(values)
+
+    return render_row
@@ -0,0 +1,225 @@
+"""Tests for the shared publisher circuit breaker."""
+
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+dummy_urllib3 = types.ModuleType("urllib3")
+
+
+class _DummyStub:  # pragma: no cover - simple stub
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+dummy_urllib3.PoolManager = _DummyStub
+dummy_urllib3.Timeout = _DummyStub
+sys.modules.setdefault("urllib3", dummy_urllib3)
+
+dummy_boto3 = types.ModuleType("boto3")
+dummy_boto3.client = lambda *args, **kwargs: None  # pragma: no cover - not used here
+sys.modules.setdefault("boto3", dummy_boto3)
+
+dummy_botocore = types.ModuleType("botocore")
+dummy_botocore_config = types.ModuleType("botocore.config")
+dummy_botocore_config.Config = _DummyStub
+dummy_botocore.config = dummy_botocore_config
+sys.modules.setdefault("botocore", dummy_botocore)
+sys.modules.setdefault("botocore.config", dummy_botocore_config)
+
+from lambda_function import circuit, handler, publisher_http, publisher_sns  # noqa: E402
+from lambda_function.circuit import CircuitBreaker, CircuitOpenError  # noqa: E402
+from lambda_function.lanes import LaneMux  # noqa: E402
+from lambda_function.publisher_http import SubmitterHttpPublisher  # noqa: E402
+from lambda_function.publisher_sns import SnsLanePublisher  # noqa: E402
+
+
+class DummyContext:
+    def get_remaining_time_in_millis(self):
+        return 900_000
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock()
+    monkeypatch.setattr(circuit, "time", c)
+    return c
+
+
+class _StatusPool:
+    """PoolManager stand-in answering every request with a fixed status."""
+
+    status = 503
+    calls = 0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def request(self, method, url, body=None, headers=None):
+        type(self).calls += 1
+        return types.SimpleNamespace(status=type(self).status)
+
+
+@pytest.fixture
+def status_pool(monkeypatch):
+    _StatusPool.status = 503
+    _StatusPool.calls = 0
+    monkeypatch.setattr(publisher_http.urllib3, "PoolManager", _StatusPool)
+    monkeypatch.setattr(publisher_http.time, "sleep", lambda s: None)
+    return _StatusPool
+
+
+def test_trips_on_consecutive_failures_and_probes_after_cooldown(clock):
+    breaker = CircuitBreaker(consecutive_failures=3, open_secs=5)
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+
+    assert breaker.state == circuit.OPEN
+    assert not breaker.allow()
+
+    clock.now += 5
+    assert breaker.allow()  # the single half-open probe
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == circuit.OPEN
+    assert breaker.trips == 2
+
+    clock.now += 5
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == circuit.CLOSED
+    assert breaker.allow()
+
+
+def test_trips_on_error_rate_over_window(clock):
+    breaker = CircuitBreaker(consecutive_failures=100, error_rate=0.5, window=10, min_requests=10)
+    for n in range(9):
+        breaker.record_success() if n % 2 else breaker.record_failure()
+    assert breaker.state == circuit.CLOSED
+
+    breaker.record_failure()  # 6 of 10 failed
+
+    assert breaker.state == circuit.OPEN
+
+
+def test_http_publisher_stops_retrying_once_open(status_pool, clock):
+    breaker = CircuitBreaker(consecutive_failures=2, open_secs=60)
+    pub = SubmitterHttpPublisher("http://example.com", breaker=breaker)
+
+    with pytest.raises(CircuitOpenError):
+        pub.send("0000000001", "Evt", {}, {}, 0)
+    assert status_pool.calls == 2  # not the full 4 attempts
+
+    with pytest.raises(CircuitOpenError):
+        pub.send("0000000002", "Evt", {}, {}, 1)
+    assert status_pool.calls == 2
+
+
+class _FakeSns:
+    """publish_batch raises `down` times, then fails entries whose Id is in `reject_ids`."""
+
+    def __init__(self, down=0, reject_ids=()):
+        self.down = down
+        self.reject_ids = set(reject_ids)
+        self.calls = 0
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        self.calls += 1
+        if self.down:
+            self.down -= 1
+            raise OSError("connection reset")
+        return {"Failed": [{"Id": e["Id"]} for e in PublishBatchRequestEntries
+                           if e["MessageGroupId"] in self.reject_ids]}
+
+
+def _sns_lane(monkeypatch, fake, breaker=None):
+    monkeypatch.setattr(publisher_sns.time, "sleep", lambda s: None)
+
+    def factory(lane_id):
+        pub = SnsLanePublisher("arn:aws:sns:us-east-1:1:t.fifo", breaker=breaker)
+        pub.sns = fake
+        return pub
+
+    return LaneMux(1, 1, factory)
+
+
+def test_sns_batch_abandoned_by_open_circuit_is_rejected_not_processed(monkeypatch, clock):
+    breaker = CircuitBreaker(consecutive_failures=2, open_secs=60)
+    fake = _FakeSns(down=10**6)
+    lanes = _sns_lane(monkeypatch, fake, breaker)
+    lanes.submit_many((0, {"loan": f"{n:010d}", "event_name": "Evt", "payload": {}, "seq": n, "job": "j"})
+                      for n in range(5))
+
+    processed, failed = lanes.drain_and_close(deadline_epoch=10**10)
+
+    assert fake.calls == 2  # retries stop once the circuit opens
+    assert (processed, failed) == (0, 0)
+    assert lanes.rejected() == (5, {"j": {None: 0}})
+    assert lanes.job_counts() == {"j": (0, 0, 5)}
+
+
+def test_sns_buffered_messages_count_only_after_their_batch(monkeypatch):
+    fake = _FakeSns(reject_ids={"0000000003"})
+    lanes = _sns_lane(monkeypatch, fake)
+    lanes.submit_many((0, {"loan": f"{n:010d}", "event_name": "Evt", "payload": {}, "seq": n, "job": "j"})
+                      for n in range(12))
+
+    processed, failed = lanes.drain_and_close(deadline_epoch=10**10)
+
+    assert (processed, failed) == (11, 1)  # loan 3 exhausted its retries
+    assert lanes.job_counts() == {"j": (11, 1, 0)}
+    assert lanes.rejected()[0] == 0
+
+
+def test_client_errors_do_not_trip(status_pool, clock):
+    status_pool.status = 400
+    breaker = CircuitBreaker(consecutive_failures=2)
+    pub = SubmitterHttpPublisher("http://example.com", breaker=breaker)
+
+    assert [pub.send("0000000001", "Evt", {}, {}, n) for n in range(5)] == [False] * 5
+    assert breaker.state == circuit.CLOSED
+
+
+def test_handler_reports_circuit_open_with_resumable_offset(status_pool):
+    event = {
+        "job_id": "DOWN",
+        "mode": "TEMPLATE_CLONE",
+        "http": {"base_url": "http://example.com"},
+        "publish": {"lane_count": 4, "time_budget_secs": 60, "submit_chunk": 20},
+        "circuit": {"consecutive_failures": 4, "open_secs": 600},
+        "template_clone": {
+            "count": 500,
+            "template_inline": {"loanNumber": "#loanNumberPlaceholder"},
+            "event_name": "InlineEvent",
+        },
+    }
+
+    result = handler.lambda_handler(event, DummyContext())
+
+    assert result["circuit_open"] is True
+    assert result["stopped_reason"] == "circuit_open"
+    assert result["partial"] is True
+    assert result["processed"] == 0
+    assert result["rejected"] > 0
+    assert result["circuit"]["state"] == "open"
+    # resume from the earliest message the open circuit refused
+    assert result["next_offset"] < 500 - result["rejected"] + 1
+
+
+def test_circuit_can_be_disabled():
+    assert circuit.breaker_from_config(False) is None
+    assert circuit.breaker_from_config({"enabled": False}) is None
+    assert circuit.breaker_from_config(None).consecutive_failures == 20
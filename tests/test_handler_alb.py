@@ -87,6 +87,9 @@ class DummyLaneMux:
     def submit(self, lane_id, item):
         self.submissions.append((lane_id, item))
 
+    def submit_many(self, items):
+        self.submissions.extend(items)
+
     def drain_and_close(self, deadline_epoch):
         return len(self.submissions), 0
 
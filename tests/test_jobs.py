@@ -0,0 +1,109 @@
+"""Tests for multi-job invocations and weighted interleaving."""
+
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+dummy_urllib3 = types.ModuleType("urllib3")
+
+
+class _DummyStub:  # pragma: no cover - simple stub
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+dummy_urllib3.PoolManager = _DummyStub
+dummy_urllib3.Timeout = _DummyStub
+sys.modules.setdefault("urllib3", dummy_urllib3)
+
+dummy_boto3 = types.ModuleType("boto3")
+dummy_boto3.client = lambda *args, **kwargs: None  # pragma: no cover - not used here
+sys.modules.setdefault("boto3", dummy_boto3)
+
+dummy_botocore = types.ModuleType("botocore")
+dummy_botocore_config = types.ModuleType("botocore.config")
+dummy_botocore_config.Config = _DummyStub
+dummy_botocore.config = dummy_botocore_config
+sys.modules.setdefault("botocore", dummy_botocore)
+sys.modules.setdefault("botocore.config", dummy_botocore_config)
+
+from lambda_function import handler  # noqa: E402
+from lambda_function.jobs import jobs_from_event, weighted_interleave  # noqa: E402
+
+
+class DummyContext:
+    def get_remaining_time_in_millis(self):
+        return 900_000
+
+
+def _clone_job(name, weight, count, event_name):
+    return {
+        "name": name,
+        "weight": weight,
+        "mode": "TEMPLATE_CLONE",
+        "event_name": event_name,
+        "template_clone": {
+            "count": count,
+            "sequence_prefix": "1" if name == "onboard" else "2",
+            "template_inline": {"loanNumber": "#loanNumberPlaceholder", "seq": "{seq}"},
+        },
+    }
+
+
+def _jobs(event):
+    return jobs_from_event(event, "JOB", "loanNumber", 8, {"jobId": "JOB"})
+
+
+def test_weighted_interleave_keeps_ratio_then_drains_leftovers():
+    jobs = _jobs({"jobs": [_clone_job("onboard", 4, 12, "A"), _clone_job("report", 1, 5, "B")]})
+
+    names = [job.name for job, _, _ in weighted_interleave(jobs)]
+
+    assert names[:15] == ["onboard", "onboard", "report", "onboard", "onboard"] * 3
+    assert names.count("onboard") == 12
+    assert names.count("report") == 5
+
+
+def test_items_carry_job_name_and_event_name():
+    jobs = _jobs({"jobs": [_clone_job("onboard", 1, 1, "A"), _clone_job("report", 1, 1, "B")]})
+
+    items = {job.name: item for job, _, item in weighted_interleave(jobs)}
+
+    assert items["onboard"]["job"] == "onboard"
+    assert items["onboard"]["event_name"] == "A"
+    assert items["report"]["attributes"]["eventName"] == "B"
+
+
+@pytest.mark.parametrize(
+    "jobs_cfg",
+    [
+        [_clone_job("a", 0, 1, "A")],
+        [_clone_job("a", 1, 1, "A"), _clone_job("a", 1, 1, "A")],
+        [dict(_clone_job("a", 1, 1, "A"), mode="BOGUS")],
+    ],
+)
+def test_invalid_jobs_are_rejected(jobs_cfg):
+    with pytest.raises(ValueError):
+        _jobs({"jobs": jobs_cfg})
+
+
+def test_handler_reports_per_job_counters():
+    event = {
+        "job_id": "MULTI",
+        "backend": "null",
+        "publish": {"lane_count": 4, "time_budget_secs": 60, "submit_chunk": 7},
+        "jobs": [_clone_job("onboard", 4, 40, "A"), _clone_job("report", 1, 10, "B")],
+    }
+
+    result = handler.lambda_handler(event, DummyContext())
+
+    assert result["processed"] == 50
+    assert result["jobs"]["onboard"]["processed"] == 40
+    assert result["jobs"]["onboard"]["next_offset"] == 40
+    assert result["jobs"]["report"]["submitted"] == 10
+    assert result["jobs"]["report"]["failed"] == 0
+    assert result["sink"]["messages"] == 50
@@ -0,0 +1,81 @@
+"""Tests for LaneMux batch submission."""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from lambda_function.circuit import CircuitOpenError  # noqa: E402
+from lambda_function.lanes import LaneMux  # noqa: E402
+
+
+class RecordingPublisher:
+    def __init__(self, lane_id):
+        self.lane_id = lane_id
+        self.sent = []
+
+    def send(self, loan, event_name, payload, attributes, seq):
+        self.sent.append(seq)
+        return seq % 10 != 9  # every tenth message fails
+
+    def flush(self):
+        return
+
+
+class RecoveringPublisher(RecordingPublisher):
+    """The circuit is open for the first send only, then the endpoint is back."""
+
+    def send(self, loan, event_name, payload, attributes, seq):
+        if not hasattr(self, "tripped"):
+            self.tripped = True
+            raise CircuitOpenError("down")
+        self.sent.append(seq)
+        return True
+
+
+def _item(loan, seq):
+    return {"loan": loan, "event_name": "Evt", "payload": {}, "attributes": {}, "seq": seq}
+
+
+def test_submit_many_keeps_per_lane_order_and_counts():
+    mux = LaneMux(lane_count=3, max_workers=3, worker_factory=RecordingPublisher)
+    try:
+        for chunk_start in range(0, 300, 50):
+            mux.submit_many((seq % 3, _item(str(seq % 3), seq)) for seq in range(chunk_start, chunk_start + 50))
+        mux.submit(0, _item("0", 300))
+
+        processed, failed = mux.drain_and_close(deadline_epoch=time.time() + 5)
+    finally:
+        mux.force_close()
+
+    assert processed + failed == 301
+    assert failed == 30
+    for lane in mux.lanes:
+        expected = [seq for seq in range(301) if seq % 3 == lane.lane_id]
+        assert lane.pub.sent == expected
+
+
+def test_submit_many_ignores_empty_input():
+    mux = LaneMux(lane_count=2, max_workers=2, worker_factory=RecordingPublisher)
+    try:
+        mux.submit_many([])
+        processed, failed = mux.drain_and_close(deadline_epoch=time.time() + 5)
+    finally:
+        mux.force_close()
+
+    assert (processed, failed) == (0, 0)
+
+
+def test_lane_keeps_rejecting_after_circuit_recovers():
+    mux = LaneMux(lane_count=1, max_workers=1, worker_factory=RecoveringPublisher)
+    try:
+        mux.submit_many((0, dict(_item("0000000001", seq), job="j")) for seq in range(3))
+        processed, failed = mux.drain_and_close(deadline_epoch=time.time() + 5)
+    finally:
+        mux.force_close()
+
+    # step 0 will be resent on resume, so steps 1 and 2 must not go out ahead of it
+    assert mux.lanes[0].pub.sent == []
+    assert (processed, failed) == (0, 0)
+    assert mux.rejected() == (3, {"j": {None: 0}})
@@ -0,0 +1,101 @@
+"""Tests for the on-demand sampling profiler."""
+
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+dummy_urllib3 = types.ModuleType("urllib3")
+
+
+class _DummyStub:  # pragma: no cover - simple stub
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+dummy_urllib3.PoolManager = _DummyStub
+dummy_urllib3.Timeout = _DummyStub
+sys.modules.setdefault("urllib3", dummy_urllib3)
+
+dummy_boto3 = types.ModuleType("boto3")
+dummy_boto3.client = lambda *args, **kwargs: None  # pragma: no cover - not used here
+sys.modules.setdefault("boto3", dummy_boto3)
+
+dummy_botocore = types.ModuleType("botocore")
+dummy_botocore_config = types.ModuleType("botocore.config")
+dummy_botocore_config.Config = _DummyStub
+dummy_botocore.config = dummy_botocore_config
+sys.modules.setdefault("botocore", dummy_botocore)
+sys.modules.setdefault("botocore.config", dummy_botocore_config)
+
+from lambda_function import handler  # noqa: E402
+from lambda_function.profiler import SamplingProfiler  # noqa: E402
+
+
+class DummyContext:
+    def get_remaining_time_in_millis(self):
+        return 900_000
+
+
+def _spin(deadline):
+    x = 0
+    while time.time() < deadline:
+        x += 1
+    return x
+
+
+def test_profiler_finds_hot_function_and_counts_idle_threads():
+    idle = threading.Event()
+    parked = threading.Thread(target=idle.wait, name="lane-3", daemon=True)
+    parked.start()
+
+    profiler = SamplingProfiler(interval_s=0.002, trace_malloc=True).start()
+    busy = threading.Thread(target=_spin, args=(time.time() + 0.3,), name="lane-7")
+    busy.start()
+    busy.join()
+    profiler.stop()
+    idle.set()
+
+    summary = profiler.summary(top_n=5)
+
+    assert summary["samples"] > 0
+    assert summary["idle_thread_samples"] > 0
+    assert summary["threads"]["lane"] > 0
+    assert any("test_profiler.py:_spin" in s["stack"] for s in summary["top_stacks"])
+    assert "top_allocations" in summary
+    assert summary["overhead_pct"] < 50
+
+
+def test_overhead_bound_stretches_interval():
+    profiler = SamplingProfiler(interval_s=0.001, max_overhead=0.001).start()
+    time.sleep(0.2)
+    profiler.stop()
+
+    # each sample costs something, so a 0.1% budget allows far fewer than 200 samples
+    assert profiler.samples < 100
+
+
+def test_profiler_does_not_outlive_a_failed_lane_build(monkeypatch):
+    def broken_lanes(**kwargs):
+        raise RuntimeError("client creation failed")
+
+    monkeypatch.setattr(handler, "LaneMux", broken_lanes)
+    event = {
+        "job_id": "PROF",
+        "mode": "TEMPLATE_CLONE",
+        "backend": "null",
+        "debug": {"profile": {"tracemalloc": True}},
+        "template_clone": {"count": 5, "template_inline": {"loanNumber": "#loanNumberPlaceholder"}},
+    }
+
+    with pytest.raises(RuntimeError):
+        handler.lambda_handler(event, DummyContext())
+
+    assert not any(t.name == "profiler" for t in threading.enumerate())
+    assert not tracemalloc.is_tracing()
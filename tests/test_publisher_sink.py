@@ -0,0 +1,138 @@
+"""Tests for the null and file sink backends."""
+
+import json
+import struct
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+dummy_urllib3 = types.ModuleType("urllib3")
+
+
+class _DummyStub:  # pragma: no cover - simple stub
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+dummy_urllib3.PoolManager = _DummyStub
+dummy_urllib3.Timeout = _DummyStub
+sys.modules.setdefault("urllib3", dummy_urllib3)
+
+dummy_boto3 = types.ModuleType("boto3")
+dummy_boto3.client = lambda *args, **kwargs: None  # pragma: no cover - not used by sinks
+sys.modules.setdefault("boto3", dummy_boto3)
+
+dummy_botocore = types.ModuleType("botocore")
+dummy_botocore_config = types.ModuleType("botocore.config")
+dummy_botocore_config.Config = _DummyStub
+dummy_botocore.config = dummy_botocore_config
+sys.modules.setdefault("botocore", dummy_botocore)
+sys.modules.setdefault("botocore.config", dummy_botocore_config)
+
+from lambda_function import handler  # noqa: E402
+from lambda_function.publisher_sink import FileLanePublisher, FileSink, NullLanePublisher  # noqa: E402
+
+
+class DummyContext:
+    def get_remaining_time_in_millis(self):
+        return 900_000
+
+
+def test_null_publisher_counts_wire_bytes():
+    pub = NullLanePublisher()
+
+    assert pub.send("0000000001", "Evt", {"a": 1}, {}, 0)
+
+    assert pub.messages == 1
+    assert pub.bytes == len(json.dumps({"loanNumber": "0000000001", "eventName": "Evt", "payload": {"a": 1}}))
+
+
+def test_file_publisher_writes_length_prefixed_frames(tmp_path):
+    sink = FileSink(str(tmp_path / "out.bin"), fmt="length_prefixed")
+    pub = FileLanePublisher(sink)
+    pub.send("0000000001", "Evt", {"n": 1}, {}, 0)
+    pub.send("0000000002", "Evt", {"n": 2}, {}, 1)
+    pub.flush()
+    sink.close()
+
+    data = (tmp_path / "out.bin").read_bytes()
+    bodies = []
+    while data:
+        (n,) = struct.unpack(">I", data[:4])
+        bodies.append(json.loads(data[4:4 + n]))
+        data = data[4 + n:]
+
+    assert [b["payload"]["n"] for b in bodies] == [1, 2]
+    assert sink.bytes_written == (tmp_path / "out.bin").stat().st_size
+
+
+def test_handler_file_backend_captures_replayable_ndjson(tmp_path):
+    out = tmp_path / "capture.ndjson"
+    event = {
+        "job_id": "SINKJOB",
+        "mode": "TEMPLATE_CLONE",
+        "backend": "file",
+        "file": {"path": str(out), "format": "ndjson"},
+        "publish": {"lane_count": 4, "time_budget_secs": 60},
+        "template_clone": {
+            "count": 20,
+            "sequence_prefix": "99",
+            "template_inline": {"loanNumber": "#loanNumberPlaceholder", "seq": "{seq}"},
+            "event_name": "InlineEvent",
+        },
+    }
+
+    result = handler.lambda_handler(event, DummyContext())
+
+    lines = out.read_bytes().splitlines()
+    assert result["processed"] == 20
+    assert result["sink"]["messages"] == 20
+    assert result["sink"]["file_bytes"] == out.stat().st_size
+    assert result["sink"]["msgs_per_s"] > 0
+    assert sorted(int(json.loads(line)["payload"]["seq"]) for line in lines) == list(range(20))
+
+
+def test_file_publisher_splits_buffer_across_lanes_and_reports_late_frames(tmp_path):
+    sink = FileSink(str(tmp_path / "out.ndjson"), buffer_bytes=1 << 20)
+
+    assert FileLanePublisher(sink, lane_count=64).buffer_bytes == (1 << 20) // 64
+    assert FileLanePublisher(sink, lane_count=4096).buffer_bytes == 8192
+
+    late = FileLanePublisher(sink, lane_count=4)
+    late.send("0000000001", "Evt", {}, {}, 0)
+    sink.close()
+    late.flush()
+
+    assert sink.bytes_written == 0
+    assert sink.bytes_dropped > 0
+
+
+def test_handler_closes_file_sink_when_lanes_fail_to_build(tmp_path, monkeypatch):
+    sinks = []
+    real_sink = handler.FileSink
+
+    def tracking_sink(*args, **kwargs):
+        sinks.append(real_sink(*args, **kwargs))
+        return sinks[-1]
+
+    def broken_lanes(**kwargs):
+        raise RuntimeError("client creation failed")
+
+    monkeypatch.setattr(handler, "FileSink", tracking_sink)
+    monkeypatch.setattr(handler, "LaneMux", broken_lanes)
+    event = {
+        "job_id": "SINKFAIL",
+        "mode": "TEMPLATE_CLONE",
+        "backend": "file",
+        "file": {"path": str(tmp_path / "out.ndjson")},
+        "template_clone": {"count": 5, "template_inline": {"loanNumber": "#loanNumberPlaceholder"}},
+    }
+
+    with pytest.raises(RuntimeError):
+        handler.lambda_handler(event, DummyContext())
+
+    assert len(sinks) == 1 and sinks[0]._f.closed
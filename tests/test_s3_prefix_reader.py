@@ -0,0 +1,393 @@
+"""Tests for S3 readers: prefix-wide replay (ordering, k-way merge, cursors), CSV rows and ranged read-ahead."""
+
+import gzip
+import io
+import json
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+dummy_urllib3 = types.ModuleType("urllib3")
+
+
+class _DummyStub:  # pragma: no cover - simple stub
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+dummy_urllib3.PoolManager = _DummyStub
+dummy_urllib3.Timeout = _DummyStub
+sys.modules.setdefault("urllib3", dummy_urllib3)
+
+dummy_boto3 = types.ModuleType("boto3")
+dummy_boto3.client = lambda *args, **kwargs: None  # pragma: no cover - tests pass a fake client
+sys.modules.setdefault("boto3", dummy_boto3)
+
+dummy_botocore = types.ModuleType("botocore")
+dummy_botocore_config = types.ModuleType("botocore.config")
+dummy_botocore_config.Config = _DummyStub
+dummy_botocore.config = dummy_botocore_config
+sys.modules.setdefault("botocore", dummy_botocore)
+sys.modules.setdefault("botocore.config", dummy_botocore_config)
+
+from lambda_function import handler, publisher_sink, s3_reader  # noqa: E402
+from lambda_function.jobs import Job, _read_ahead  # noqa: E402
+from lambda_function.s3_reader import S3PrefixReader, iter_csv_rows, iter_object_lines  # noqa: E402
+
+
+class _RangeError(Exception):
+    response = {"Error": {"Code": "InvalidRange"}}
+
+
+class FakeS3:
+    """In-memory S3 supporting list_objects_v2 pagination and ranged GETs."""
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.gets = []
+
+    def get_paginator(self, name):
+        assert name == "list_objects_v2"
+        fake = self
+
+        class _Paginator:
+            def paginate(self, Bucket, Prefix):
+                keys = sorted(k for k in fake.objects if k.startswith(Prefix))
+                yield {"Contents": [{"Key": k, "Size": len(fake.objects[k])} for k in keys[:2]]}
+                yield {"Contents": [{"Key": k, "Size": len(fake.objects[k])} for k in keys[2:]]}
+
+        return _Paginator()
+
+    def head_object(self, Bucket, Key):
+        return {"ContentLength": len(self.objects[Key]), "ETag": '"etag"'}
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None):
+        self.gets.append((Key, Range))
+        data = self.objects[Key]
+        if Range:
+            lo, _, hi = Range[len("bytes="):].partition("-")
+            if int(lo) >= len(data):
+                raise _RangeError()
+            data = data[int(lo):int(hi) + 1] if hi else data[int(lo):]
+        return {"Body": io.BytesIO(data)}
+
+
+def _ndjson(*recs):
+    return b"".join(json.dumps(r).encode("utf-8") + b"\n" for r in recs)
+
+
+def _objects():
+    return {
+        "exports/part-0002.ndjson": _ndjson({"loanNumber": "3", "ts": "2025-01-01T00:00:02"}),
+        "exports/part-0001.ndjson": _ndjson(
+            {"loanNumber": "1", "ts": "2025-01-01T00:00:01"},
+            {"loanNumber": "2", "ts": "2025-01-01T00:00:03"},
+        ),
+        "exports/part-0003.ndjson.gz": gzip.compress(_ndjson({"loanNumber": "4", "ts": "2025-01-01T00:00:00"})),
+        "exports/": b"",
+    }
+
+
+def test_key_order_reads_every_part_in_sequence():
+    reader = S3PrefixReader("s3://bucket/exports/", prefetch=2, s3=FakeS3(_objects()))
+
+    loans = [rec["loanNumber"] for _, _, rec in reader.records()]
+
+    assert loans == ["1", "2", "3", "4"]
+    assert reader.cursor() is None
+
+
+def test_merge_order_interleaves_parts_on_timestamp():
+    reader = S3PrefixReader("s3://bucket/exports/", order="merge", merge_field="ts", s3=FakeS3(_objects()))
+
+    loans = [rec["loanNumber"] for _, _, rec in reader.records()]
+
+    assert loans == ["4", "1", "3", "2"]
+
+
+def test_cursor_resumes_with_byte_offset():
+    objects = _objects()
+    reader = S3PrefixReader("s3://bucket/exports/", s3=FakeS3(objects))
+    it = reader.records()
+    key, seq, rec = next(it)
+    assert (key, seq, rec["loanNumber"]) == ("exports/part-0001.ndjson", 0, "1")
+    cursor = reader.cursor()
+    reader.close()
+    assert cursor["key"] == "exports/part-0001.ndjson"
+    assert cursor["offset"] == objects["exports/part-0001.ndjson"].index(b"\n") + 1
+
+    fake = FakeS3(objects)
+    resumed = S3PrefixReader("s3://bucket/exports/", cursor=cursor, s3=fake)
+    loans = [rec["loanNumber"] for _, _, rec in resumed.records()]
+
+    assert loans == ["2", "3", "4"]
+    assert ("exports/part-0001.ndjson", f"bytes={cursor['offset']}-") in fake.gets
+
+
+def test_merge_cursor_resumes_after_last_yielded_record():
+    objects = _objects()
+    reader = S3PrefixReader("s3://bucket/exports/", order="merge", merge_field="ts", s3=FakeS3(objects))
+    it = reader.records()
+    assert next(it)[2]["loanNumber"] == "4"
+    cursor = reader.cursor()
+    reader.close()
+
+    assert cursor == {"offsets": {
+        "exports/part-0001.ndjson": 0,
+        "exports/part-0002.ndjson": 0,
+        "exports/part-0003.ndjson.gz": len(gzip.decompress(objects["exports/part-0003.ndjson.gz"])),
+    }}
+
+    resumed = S3PrefixReader("s3://bucket/exports/", order="merge", merge_field="ts", cursor=cursor,
+                             s3=FakeS3(objects))
+    assert [rec["loanNumber"] for _, _, rec in resumed.records()] == ["1", "3", "2"]
+
+
+def test_merge_cursor_drops_finished_objects_and_caps_object_count():
+    reader = S3PrefixReader("s3://bucket/exports/", order="merge", merge_field="ts", s3=FakeS3(_objects()))
+    it = reader.records()
+    assert [next(it)[2]["loanNumber"] for _ in range(3)] == ["4", "1", "3"]
+
+    offsets = reader.cursor()["offsets"]
+    reader.close()
+
+    assert "exports/part-0003.ndjson.gz" not in offsets
+    assert offsets["exports/part-0002.ndjson"] == len(_objects()["exports/part-0002.ndjson"])
+    assert reader.max_buffered == 666
+    with pytest.raises(ValueError):
+        S3PrefixReader("s3://bucket/exports/", order="merge", merge_field="ts", s3=FakeS3(_objects()),
+                       max_merge_objects=2)
+
+
+def test_cursor_past_end_of_object_is_treated_as_exhausted():
+    objects = _objects()
+    size = len(objects["exports/part-0002.ndjson"])
+    cursor = {"key": "exports/part-0002.ndjson", "offset": size}
+    reader = S3PrefixReader("s3://bucket/exports/", cursor=cursor, s3=FakeS3(objects))
+
+    assert [rec["loanNumber"] for _, _, rec in reader.records()] == ["4"]
+
+
+def test_merge_requires_field():
+    with pytest.raises(ValueError):
+        S3PrefixReader("s3://bucket/exports/", order="merge", s3=FakeS3(_objects()))
+
+
+def test_parallel_ranges_stitch_lines_across_part_boundaries():
+    lines = [json.dumps({"loanNumber": str(n), "pad": "x" * (n % 7)}).encode("utf-8") for n in range(40)]
+    data = b"\n".join(lines)  # no trailing newline on the last record
+    fake = FakeS3({"big.ndjson": data})
+
+    out = list(iter_object_lines(fake, "bucket", "big.ndjson", concurrency=3, part_size=17))
+
+    assert [line for _, _, line in out] == lines
+    assert out[-1][1] == len(data)
+    assert all(data[start:end].rstrip(b"\n") == line for start, end, line in out)
+    assert len(fake.gets) == -(-len(data) // 17)
+
+
+def test_parallel_ranges_resume_and_gzip():
+    body = _ndjson(*({"loanNumber": str(n)} for n in range(30)))
+    fake = FakeS3({"big.ndjson": body, "big.ndjson.gz": gzip.compress(body)})
+    resume_at = body.index(b"\n", 100) + 1
+
+    plain = list(iter_object_lines(fake, "bucket", "big.ndjson", start_offset=resume_at, concurrency=4, part_size=16))
+    gz = list(iter_object_lines(fake, "bucket", "big.ndjson.gz", start_offset=resume_at, concurrency=4, part_size=16))
+
+    assert plain == gz
+    assert plain[0][0] == resume_at
+    assert json.loads(plain[-1][2]) == {"loanNumber": "29"}
+
+
+def test_parallel_ranges_bound_inflight_parts():
+    fake = FakeS3({"big.ndjson": _ndjson(*({"n": n} for n in range(200)))})
+    parts = s3_reader.iter_ranges_parallel(fake, "bucket", "big.ndjson", 0, 2000, part_size=10, concurrency=2)
+
+    next(parts)
+    parts.close()
+
+    # two parts in flight, plus one submitted when the first was handed out
+    assert len(fake.gets) <= 3
+
+
+class _ClientError(Exception):
+    def __init__(self, code, status):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}
+
+
+class FlakyS3(FakeS3):
+    """Raises the queued errors from get_object before serving normally."""
+
+    def __init__(self, objects, errors):
+        super().__init__(objects)
+        self.errors = list(errors)
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None):
+        if self.errors:
+            self.gets.append((Key, Range))
+            raise self.errors.pop(0)
+        return super().get_object(Bucket, Key, Range=Range, IfMatch=IfMatch)
+
+
+def test_parallel_ranges_fail_fast_when_object_changes(monkeypatch):
+    monkeypatch.setattr(s3_reader.time, "sleep", lambda s: None)
+    fake = FlakyS3({"big.ndjson": b"x" * 100}, [_ClientError("PreconditionFailed", 412)])
+    parts = s3_reader.iter_ranges_parallel(fake, "bucket", "big.ndjson", 0, 100, part_size=100,
+                                           concurrency=1, etag='"etag"')
+
+    with pytest.raises(RuntimeError, match="changed while it was being read"):
+        list(parts)
+    assert len(fake.gets) == 1
+
+
+def test_parallel_ranges_retry_only_transient_errors(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(s3_reader.time, "sleep", sleeps.append)
+    data = b"x" * 100
+    fake = FlakyS3({"big.ndjson": data}, [_ClientError("SlowDown", 503), ConnectionResetError()])
+    assert b"".join(s3_reader.iter_ranges_parallel(fake, "bucket", "big.ndjson", 0, 100, part_size=100,
+                                                   concurrency=1)) == data
+    assert len(sleeps) == 2
+
+    denied = FlakyS3({"big.ndjson": data}, [_ClientError("AccessDenied", 403)])
+    with pytest.raises(_ClientError):
+        list(s3_reader.iter_ranges_parallel(denied, "bucket", "big.ndjson", 0, 100, part_size=100, concurrency=1))
+    assert len(denied.gets) == 1
+
+
+@pytest.fixture
+def s3_objects(monkeypatch):
+    """Objects served by the module-level boto3 client (for readers that build their own)."""
+    objects = {}
+    fake = FakeS3(objects)
+    monkeypatch.setattr(s3_reader.boto3, "client", lambda *args, **kwargs: fake, raising=False)
+    return objects
+
+
+def test_csv_rows_strip_bom_and_use_delimiter(s3_objects):
+    s3_objects["lists/a.csv"] = "\ufeffLOAN_NO;NAME\n1;Doe\n2;Roe\n".encode("utf-8")
+
+    rows = list(iter_csv_rows("s3://bucket/lists/a.csv", delimiter=";"))
+
+    assert rows == [(0, {"LOAN_NO": "1", "NAME": "Doe"}), (1, {"LOAN_NO": "2", "NAME": "Roe"})]
+
+
+def test_csv_offset_counts_data_rows_across_quoted_newlines(s3_objects):
+    s3_objects["lists/a.csv"] = b'LOAN_NO,NOTE\n1,"two\nlines"\n2,plain\n3,"a, b"\n'
+
+    rows = list(iter_csv_rows("s3://bucket/lists/a.csv", start_offset=1))
+
+    assert rows == [(1, {"LOAN_NO": "2", "NOTE": "plain"}), (2, {"LOAN_NO": "3", "NOTE": "a, b"})]
+    first = next(iter_csv_rows("s3://bucket/lists/a.csv"))
+    assert first == (0, {"LOAN_NO": "1", "NOTE": "two\nlines"})
+
+
+def test_csv_job_renders_rows_with_template_event_name_and_offset(s3_objects):
+    s3_objects["lists/batch.csv"] = b"LOAN_NO,BAL\n11,1.5\n12,2\n13,3\n"
+    cfg = {
+        "mode": "S3_REPLAY",
+        "s3_replay": {
+            "s3_uri": "s3://bucket/lists/batch.csv",
+            "format": "csv",
+            "offset": 1,
+            "loan_column": "LOAN_NO",
+            "columns": {"{bal}": {"column": "BAL", "type": "number"}},
+            "template_inline": {"eventName": "RowEvent", "loanNumber": "#loanNumberPlaceholder",
+                                "payload": {"balance": "{bal}", "seq": "{seq}"}},
+        },
+    }
+    job = Job("csv", cfg, "JOB", "loanNumber", 4, {"jobId": "JOB"})
+
+    items = [item for _, item in job.items()]
+
+    assert [(i["loan"], i["seq"], i["event_name"]) for i in items] == [
+        ("0000000012", 1, "RowEvent"), ("0000000013", 2, "RowEvent")]
+    assert items[0]["payload"]["payload"] == {"balance": 2, "seq": "1"}
+    assert items[0]["attributes"]["eventName"] == "RowEvent"
+    assert job.cursor() == {"next_offset": 3}
+
+
+class DummyContext:
+    def get_remaining_time_in_millis(self):
+        return 900_000
+
+
+@pytest.mark.parametrize("order", ["key", "merge"])
+def test_handler_prefix_replay_resumes_from_cursor_without_loss_or_duplicates(s3_objects, monkeypatch, order):
+    for part in range(3):
+        s3_objects[f"exports/part-{part}.ndjson"] = _ndjson(
+            *({"loanNumber": str(100 * part + n), "ts": f"2025-01-01T00:00:{3 * n + part:02d}"} for n in range(5)))
+    sent = []
+    send = publisher_sink.NullLanePublisher.send
+
+    def recording_send(self, loan, event_name, payload, attributes, seq):
+        sent.append(int(loan))
+        return send(self, loan, event_name, payload, attributes, seq)
+
+    monkeypatch.setattr(publisher_sink.NullLanePublisher, "send", recording_send)
+    event = {
+        "job_id": "PREFIX",
+        "mode": "S3_REPLAY",
+        "backend": "null",
+        "publish": {"lane_count": 2, "max_messages_per_invocation": 6, "submit_chunk": 4},
+        "s3_replay": {"s3_prefix": "s3://bucket/exports/", "order": order, "merge_field": "ts", "prefetch": 2},
+    }
+
+    first = handler.lambda_handler(event, DummyContext())
+    assert first["processed"] == 6
+    assert first["next_offset"] is None
+    assert first["next_cursor"] is not None
+
+    event["s3_replay"]["cursor"] = first["next_cursor"]
+    event["publish"]["max_messages_per_invocation"] = 0
+    second = handler.lambda_handler(event, DummyContext())
+
+    assert second["processed"] == 9
+    assert second["next_cursor"] is None
+    assert sorted(sent) == [100 * part + n for part in range(3) for n in range(5)]
+
+
+def test_handler_prefix_replay_requires_ndjson(s3_objects):
+    event = {
+        "mode": "S3_REPLAY",
+        "backend": "null",
+        "s3_replay": {"s3_prefix": "s3://bucket/exports/", "format": "csv"},
+    }
+
+    with pytest.raises(ValueError, match="only supports format ndjson"):
+        handler.lambda_handler(event, DummyContext())
+
+
+@pytest.mark.parametrize("cfg, expected", [
+    (None, (1, 8 << 20)),
+    (False, (1, 8 << 20)),
+    ({}, (1, 8 << 20)),
+    (True, (8, 8 << 20)),
+    ({"concurrency": 3}, (3, 8 << 20)),
+    ({"part_mb": 0.5}, (8, 1 << 19)),
+])
+def test_read_ahead_is_opt_in(cfg, expected):
+    assert _read_ahead(cfg) == expected
+
+
+@pytest.mark.parametrize("read_ahead, ranged", [(None, False), ({"concurrency": 2, "part_mb": 64 / (1 << 20)}, True)])
+def test_ndjson_job_uses_ranged_gets_only_with_read_ahead(s3_objects, read_ahead, ranged):
+    s3_objects["exports/one.ndjson"] = _ndjson(*({"loanNumber": str(n)} for n in range(10)))
+    s3r = {"s3_uri": "s3://bucket/exports/one.ndjson"}
+    if read_ahead is not None:
+        s3r["read_ahead"] = read_ahead
+    job = Job("one", {"mode": "S3_REPLAY", "s3_replay": s3r}, "JOB", "loanNumber", 4, {"jobId": "JOB"})
+
+    loans = [item["loan"] for _, item in job.items()]
+    gets = s3_reader.boto3.client("s3").gets
+
+    assert loans == [f"{n:010d}" for n in range(10)]
+    if ranged:
+        assert len(gets) > 1 and all(rng.startswith("bytes=") for _, rng in gets)
+    else:
+        assert gets == [("exports/one.ndjson", None)]
@@ -0,0 +1,97 @@
+"""Tests for CSV rows joined onto a compiled template."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from lambda_function.template import compile_row_renderer, compile_template, render_with_loan  # noqa: E402
+
+
+TEMPLATE = {
+    "loanNumber": "#loanNumberPlaceholder",
+    "legacy": "#loanNumberPlacehoder",
+    "payload": {
+        "ssn": "XXX-XX-#loanNumberPlaceholder",
+        "seq": "{seq}",
+        "borrower": "{name}",
+        "principalBalance": "{balance}",
+        "tags": ["{name}", 1],
+    },
+}
+
+
+def test_compiled_template_matches_render_with_loan():
+    render = compile_template(TEMPLATE, ["#loanNumberPlacehoder", "#loanNumberPlaceholder", "{seq}"])
+
+    values = {"#loanNumberPlacehoder": "0000000042", "#loanNumberPlaceholder": "0000000042", "{seq}": "7"}
+
+    assert render(values) == render_with_loan(TEMPLATE, "0000000042", 7)
+
+
+def test_row_renderer_maps_columns_and_escapes_values():
+    render_row = compile_row_renderer(
+        TEMPLATE,
+        {"{name}": "BORROWER", "{balance}": {"column": "BAL", "type": "number"}},
+        loan_column="LOAN_NO",
+    )
+
+    loan, payload = render_row({"LOAN_NO": "42", "BORROWER": 'Doe, "Jane"', "BAL": "250000.5"}, 3)
+
+    assert loan == "0000000042"
+    assert payload["loanNumber"] == "0000000042"
+    assert payload["legacy"] == "0000000042"
+    assert payload["payload"]["ssn"] == "XXX-XX-0000000042"
+    assert payload["payload"]["seq"] == "3"
+    assert payload["payload"]["borrower"] == 'Doe, "Jane"'
+    assert payload["payload"]["tags"] == ['Doe, "Jane"', 1]
+    assert payload["payload"]["principalBalance"] == 250000.5
+
+
+def test_row_renderer_renders_empty_number_as_null():
+    render_row = compile_row_renderer(TEMPLATE, {"{balance}": {"column": "BAL", "type": "number"}}, "LOAN_NO")
+
+    _, payload = render_row({"LOAN_NO": "1", "BAL": ""}, 0)
+
+    assert payload["payload"]["principalBalance"] is None
+
+
+def test_row_renderer_rejects_unknown_type():
+    with pytest.raises(ValueError):
+        compile_row_renderer(TEMPLATE, {"{balance}": {"column": "BAL", "type": "date"}})
+
+
+@pytest.mark.parametrize("cell", ["N/A", '1,"admin":true', "NaN", "inf"])
+def test_row_renderer_rejects_non_numeric_number_cells(cell):
+    render_row = compile_row_renderer(TEMPLATE, {"{balance}": {"column": "BAL", "type": "number"}}, "LOAN_NO")
+
+    with pytest.raises(ValueError) as exc:
+        render_row({"LOAN_NO": "1", "BAL": cell}, 12)
+
+    assert "CSV row 12" in str(exc.value)
+    assert "'BAL'" in str(exc.value)
+
+
+def test_row_renderer_keeps_integers_integral():
+    render_row = compile_row_renderer(TEMPLATE, {"{balance}": {"column": "BAL", "type": "number"}}, "LOAN_NO")
+
+    _, payload = render_row({"LOAN_NO": "1", "BAL": " 250000 "}, 0)
+
+    assert payload["payload"]["principalBalance"] == 250000
+    assert isinstance(payload["payload"]["principalBalance"], int)
+
+
+@pytest.mark.parametrize("columns, loan_column, missing", [
+    ({"{name}": "BORROWR"}, "LOAN_NO", "BORROWR"),
+    ({"{balance}": {"column": "BALANCE", "type": "number"}}, "LOAN_NO", "BALANCE"),
+    ({"{name}": "BORROWER"}, "LOAN", "LOAN"),
+])
+def test_row_renderer_rejects_columns_missing_from_header(columns, loan_column, missing):
+    render_row = compile_row_renderer(TEMPLATE, columns, loan_column)
+
+    with pytest.raises(ValueError) as exc:
+        render_row({"LOAN_NO": "1", "BORROWER": "Doe", "BAL": "1"}, 0)
+
+    assert repr(missing) in str(exc.value)